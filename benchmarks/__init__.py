@@ -0,0 +1,25 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Benchmarks for the overhead of the OpsMop engine itself.  Synthetic policies built from
+# no-op resources are run through the Executor, so what is measured is the cost of Fields,
+# Scope, conditions, templates and Callbacks rather than packages or services.
+#
+# Run from the top of the checkout:
+#
+#    python3 -m benchmarks.run --roles 4 --resources 250 --depth 3 --output results.json
+#    python3 -m benchmarks.run --compare results.json
+#
+# benchmarks.memory reports the bytes used per resource and per provider in the same way.
@@ -0,0 +1,104 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from opsmop.types.file import File
+from opsmop.types.package import Package
+
+from benchmarks.policies import build_policy
+from benchmarks.run import compare, git_revision
+from benchmarks.stubs import Noop
+
+# resources of each kind, constructed with typical parameters
+KINDS = dict(
+    noop = lambda i: Noop("n%d" % i, msg="hello"),
+    package = lambda i: Package("p%d" % i, version="1.0"),
+    file = lambda i: File("/tmp/f%d" % i, mode=0o644, owner="root")
+)
+
+def _bytes_per(fn, count):
+    """
+    Bytes allocated, and still held, per call of fn(i).
+    """
+    fn(-1)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [ fn(i) for i in range(count) ]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) // count
+
+def bench_resources(count):
+    return { kind: _bytes_per(fn, count) for (kind, fn) in KINDS.items() }
+
+def bench_providers(count):
+    """
+    Bytes per provider object, not counting the resource it is for.
+    """
+    results = dict()
+    for kind in [ 'noop', 'file' ]:
+        resources = [ KINDS[kind](i) for i in range(count + 1) ]
+        results[kind] = _bytes_per(lambda i: resources[i].provider(), count)
+    return results
+
+def bench_policy(count):
+    """
+    Bytes per resource in a whole synthetic policy, see benchmarks.policies.
+    """
+    roles = 4
+    return dict(policy=_bytes_per(lambda i: build_policy(roles=roles, resources=count // roles), 1) // count)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="measure the memory used by OpsMop resources and providers")
+    parser.add_argument('--count', type=int, default=20000, help="how many objects of each kind to construct")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare with the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    results = dict(
+        meta = dict(
+            time = time.time(),
+            python = sys.version.split()[0],
+            platform = platform.platform(),
+            revision = git_revision(),
+            count = args.count
+        ),
+        resource_bytes = bench_resources(args.count),
+        provider_bytes = bench_providers(args.count),
+        policy_bytes = bench_policy(args.count)
+    )
+
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(json.load(fd), results)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=4)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from opsmop.core.handlers import Handlers
+from opsmop.core.policy import Policy
+from opsmop.core.resources import Resources
+from opsmop.core.role import Role
+from opsmop.core.roles import Roles
+from opsmop.lookups.template import T
+from opsmop.types.set import Set
+
+from benchmarks.stubs import Noop, Probe
+
+# how many collections each level of nesting splits resources into
+BRANCHES = 4
+
+
+class BenchRole(Role):
+
+    def __init__(self, resources, handlers, **kwargs):
+        self._bench_resources = resources
+        self._bench_handlers = handlers
+        super().__init__(**kwargs)
+
+    def set_variables(self):
+        return dict(x=1, greeting='hello')
+
+    def set_resources(self):
+        return self._bench_resources
+
+    def set_handlers(self):
+        return self._bench_handlers
+
+
+class BenchPolicy(Policy):
+
+    def __init__(self, roles, **kwargs):
+        self._bench_roles = roles
+        super().__init__(**kwargs)
+
+    def set_roles(self):
+        return Roles(*self._bench_roles)
+
+
+def _every(i, n):
+    # True for every nth item, never if n is 0
+    return n > 0 and i % n == 0
+
+def _nest(items, depth):
+    """
+    Splits items into nested Resources collections, depth levels deep.
+    """
+    if depth <= 0 or len(items) <= 1:
+        return items
+    size = max(1, (len(items) + BRANCHES - 1) // BRANCHES)
+    return [ Resources(*_nest(items[i:i+size], depth-1)) for i in range(0, len(items), size) ]
+
+def build_policy(roles=4, resources=250, depth=2, when_every=4, tag_every=10, set_every=50, handler_every=25, template_every=5, changed_every=2):
+    """
+    Builds a synthetic policy of roles x resources Noop resources nested depth levels deep.
+    The *_every arguments give how often (every Nth resource, 0 for never) a resource gets
+    a when= condition, a tag, is a Set(), signals a handler, has a templated msg, or plans a change.
+    """
+    all_roles = []
+    for r in range(roles):
+        items = []
+        for i in range(resources):
+            if _every(i + 1, set_every):
+                items.append(Set(x=i))
+                continue
+            kwargs = dict()
+            if _every(i, when_every):
+                kwargs['when'] = "x > 0"
+            if _every(i, tag_every):
+                kwargs['tags'] = [ 't%d' % (i % 3) ]
+            if _every(i, handler_every):
+                kwargs['signals'] = 'h%d' % (i % 2)
+            if _every(i, template_every):
+                kwargs['msg'] = T("{{ greeting }} {{ x }}")
+            items.append(Noop("r%d_%d" % (r, i), changed=_every(i, changed_every), **kwargs))
+        handlers = Handlers(
+            h0 = Noop("h0_%d" % r, changed=True),
+            h1 = Noop("h1_%d" % r, changed=True)
+        )
+        all_roles.append(BenchRole(Resources(*_nest(items, depth)), handlers))
+    return BenchPolicy(all_roles)
+
+def build_probe_policy(probes=1000, cmd="id -u"):
+    """
+    Builds a policy of one role with probes resources that each run cmd while planning.
+    """
+    items = [ Probe("p%d" % i, cmd=cmd) for i in range(probes) ]
+    return BenchPolicy([ BenchRole(Resources(*items), Handlers()) ])
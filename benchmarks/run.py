@@ -0,0 +1,258 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from opsmop.callbacks.callbacks import Callbacks
+from opsmop.callbacks.common import CommonCallbacks
+from opsmop.callbacks.local import LocalCliCallbacks
+from opsmop.core.engine import CommandEngine
+from opsmop.core.executor import Executor
+from opsmop.core.template import Template
+
+from benchmarks.policies import build_policy, build_probe_policy
+from benchmarks.stubs import Noop
+
+MODES = [ 'validate', 'check', 'apply' ]
+
+# how many times to call the code measured by the micro benchmarks
+MICRO_COUNT = 5000
+
+def _quiet():
+    """
+    Swallow anything the callbacks print, so the terminal is not part of the measurement.
+    """
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+def _set_callbacks(kind):
+    if kind == 'local':
+        Callbacks().set_callbacks([ LocalCliCallbacks(), CommonCallbacks() ])
+    elif kind == 'common':
+        Callbacks().set_callbacks([ CommonCallbacks() ])
+    else:
+        Callbacks().set_callbacks([])
+
+def _timed(fn, repeat):
+    """
+    Returns (best, mean) seconds over repeat calls of fn.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return (min(times), sum(times) / len(times))
+
+def _per_call_us(fn, count=MICRO_COUNT):
+    start = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - start) / count * 1000000
+
+def git_revision():
+    try:
+        return subprocess.check_output([ 'git', 'rev-parse', 'HEAD' ], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+# ---------------------------------------------------------------
+
+def bench_modes(args, params):
+    """
+    Runs the whole policy through the Executor in each mode.
+    """
+    start = time.perf_counter()
+    policy = build_policy(**params)
+    build = time.perf_counter() - start
+    leaves = params['roles'] * params['resources']
+    results = dict(build=dict(seconds=build, per_resource_us=build / leaves * 1000000))
+    for mode in args.modes:
+        def run():
+            executor = Executor([ policy ], tags=args.tags, extra_vars=dict(), relative_root=os.getcwd())
+            with _quiet():
+                getattr(executor, mode)()
+        (best, mean) = _timed(run, args.repeat)
+        results[mode] = dict(seconds=best, mean_seconds=mean, per_resource_us=best / leaves * 1000000)
+    return results
+
+def bench_memory(args, params):
+    """
+    Peak memory allocated by Python while building the policy and applying it once.
+    """
+    gc.collect()
+    tracemalloc.start()
+    policy = build_policy(**params)
+    with _quiet():
+        Executor([ policy ], tags=args.tags, extra_vars=dict(), relative_root=os.getcwd()).apply()
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(peak_bytes=peak, per_resource_bytes=peak // (params['roles'] * params['resources']))
+
+def bench_spawn(args):
+    """
+    Plans (in check mode) a policy of resources that each run one command, with commands started
+    by this process and then by the fork server (see opsmop.core.engine), to measure the cost of
+    starting a command.
+    """
+    policy = build_probe_policy(probes=args.probes, cmd=args.probe_command)
+    results = dict()
+    for (name, enabled) in [ ('popen', False), ('fork_server', True) ]:
+        CommandEngine().set_fork_server(enabled)
+        def run():
+            executor = Executor([ policy ], extra_vars=dict(), relative_root=os.getcwd())
+            with _quiet():
+                executor.check()
+        (best, mean) = _timed(run, args.repeat)
+        results[name] = dict(seconds=best, mean_seconds=mean, per_command_us=best / args.probes * 1000000)
+    CommandEngine().set_fork_server(None)
+    return results
+
+def bench_micro(args):
+    """
+    Costs of the pieces every resource goes through: Fields (constructing a resource), Scope,
+    Callbacks dispatch and template rendering.
+    """
+    results = dict()
+    results['fields_us'] = _per_call_us(lambda: Noop("x", msg="y", changed=True, when="x > 0"))
+
+    # a small policy gives a realistic scope chain to work below
+    policy = build_policy(roles=1, resources=1, depth=0)
+    policy.init_scope()
+    role = policy.get_roles().items[0]
+    policy.attach_child_scope_for(role)
+    resource = Noop("x")
+    results['scope_create_us'] = _per_call_us(lambda: role.scope().deeper_scope_for(resource))
+    resource.set_scope(role.scope().deeper_scope_for(resource))
+    results['scope_variables_us'] = _per_call_us(lambda: resource.get_variables())
+
+    for kind in [ 'none', 'local' ]:
+        _set_callbacks(kind)
+        with _quiet():
+            results['callbacks_%s_us' % kind] = _per_call_us(lambda: Callbacks().on_resource(resource, False))
+
+    results['template_cached_us'] = _per_call_us(lambda: Template.from_string("{{ greeting }} {{ x }}", resource))
+    counter = iter(range(MICRO_COUNT * 2))
+    results['template_compile_us'] = _per_call_us(lambda: Template.from_string("{{ greeting }} %d" % next(counter), resource), count=500)
+    results['native_eval_us'] = _per_call_us(lambda: Template.native_eval("x > 0", resource))
+    return results
+
+# ---------------------------------------------------------------
+
+def compare(old, new):
+    """
+    Prints every number in both result sets with the ratio new/old.
+    """
+    print("%-40s %14s %14s %8s" % ("", "old", "new", "ratio"))
+    for section in sorted(new.keys()):
+        if section in [ 'meta', 'template_cache' ]:
+            continue
+        for (key, value) in sorted(new[section].items()):
+            values = value if type(value) == dict else { '': value }
+            previous = old.get(section, {}).get(key, {})
+            if type(previous) != dict:
+                previous = { '': previous }
+            for (name, number) in sorted(values.items()):
+                before = previous.get(name, None)
+                label = "%s.%s%s" % (section, key, "." + name if name else "")
+                if before:
+                    print("%-40s %14.3f %14.3f %8.2f" % (label, before, number, number / before))
+                else:
+                    print("%-40s %14s %14.3f" % (label, "-", number))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="measure OpsMop engine overhead with no-op resources")
+    parser.add_argument('--roles', type=int, default=4)
+    parser.add_argument('--resources', type=int, default=250, help="resources per role")
+    parser.add_argument('--depth', type=int, default=2, help="levels of nested Resources() collections")
+    parser.add_argument('--when-every', type=int, default=4, help="every Nth resource has a when= condition (0 for none)")
+    parser.add_argument('--tag-every', type=int, default=10, help="every Nth resource is tagged")
+    parser.add_argument('--set-every', type=int, default=50, help="every Nth resource is a Set()")
+    parser.add_argument('--handler-every', type=int, default=25, help="every Nth resource signals a handler")
+    parser.add_argument('--template-every', type=int, default=5, help="every Nth resource renders a template")
+    parser.add_argument('--changed-every', type=int, default=2, help="every Nth resource plans a change")
+    parser.add_argument('--modes', default=",".join(MODES), help="comma separated, from %s" % ",".join(MODES))
+    parser.add_argument('--tags', help="comma separated tags to select (the generated tags are t0, t1 and t2)")
+    parser.add_argument('--callbacks', default='common', choices=[ 'none', 'common', 'local' ], help="callbacks attached while running")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per mode, the best is reported")
+    parser.add_argument('--no-memory', action='store_true', help="skip the (slower) memory measurement")
+    parser.add_argument('--probes', type=int, default=0, help="also time planning this many resources that each run a command")
+    parser.add_argument('--probe-command', default="id -u", help="the command each probe runs")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="compare with the results in this JSON file")
+    args = parser.parse_args(argv)
+
+    args.modes = [ m.strip() for m in args.modes.split(",") if m.strip() ]
+    for mode in args.modes:
+        if mode not in MODES:
+            parser.error("unknown mode: %s" % mode)
+    if args.tags:
+        args.tags = args.tags.split(",")
+
+    params = dict(
+        roles = args.roles,
+        resources = args.resources,
+        depth = args.depth,
+        when_every = args.when_every,
+        tag_every = args.tag_every,
+        set_every = args.set_every,
+        handler_every = args.handler_every,
+        template_every = args.template_every,
+        changed_every = args.changed_every
+    )
+
+    _set_callbacks(args.callbacks)
+    results = dict(
+        meta = dict(
+            time = time.time(),
+            python = sys.version.split()[0],
+            platform = platform.platform(),
+            revision = git_revision(),
+            params = params,
+            tags = args.tags,
+            callbacks = args.callbacks,
+            repeat = args.repeat
+        ),
+        modes = bench_modes(args, params)
+    )
+    if not args.no_memory:
+        results['memory'] = bench_memory(args, params)
+    if args.probes:
+        results['spawn'] = bench_spawn(args)
+    results['micro'] = bench_micro(args)
+    results['template_cache'] = { k: v._asdict() for (k, v) in Template.cache_info().items() }
+
+    if args.compare:
+        with open(args.compare) as fd:
+            compare(json.load(fd), results)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=4)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from opsmop.core.field import Field
+from opsmop.core.fields import Fields
+from opsmop.providers.provider import Provider
+from opsmop.types.type import Type
+
+
+class NoopProvider(Provider):
+
+    """
+    Plans and applies one action when 'changed' is set, and otherwise does nothing at all.
+    """
+
+    def plan(self):
+        if self.changed:
+            self.needs('noop')
+
+    def apply(self):
+        if self.should('noop'):
+            self.do('noop')
+        return self.ok()
+
+
+class Noop(Type):
+
+    """
+    A resource that touches nothing on the system, for measuring the engine around it.
+    msg may be a T() lookup so that template rendering is part of the run.
+    """
+
+    __slots__ = []
+
+    def __init__(self, name, **kwargs):
+        self.setup(name=name, **kwargs)
+
+    def fields(self):
+        return Fields(
+            self,
+            name = Field(kind=str, allow_none=False, help="a name for the resource"),
+            msg = Field(kind=str, default=None, help="an optional (templated) message, which is not shown"),
+            changed = Field(kind=bool, default=False, help="if true, plans and applies an action")
+        )
+
+    def default_provider(self):
+        return NoopProvider
+
+
+class ProbeProvider(Provider):
+
+    """
+    Runs its command while planning, the way providers look up the state of the system, and plans nothing.
+    """
+
+    def plan(self):
+        self.test(self.cmd, echo=False)
+
+    def apply(self):
+        return self.ok()
+
+
+class Probe(Type):
+
+    """
+    A resource that runs one harmless command, for measuring how long starting commands takes.
+    """
+
+    __slots__ = []
+
+    def __init__(self, name, **kwargs):
+        self.setup(name=name, **kwargs)
+
+    def fields(self):
+        return Fields(
+            self,
+            name = Field(kind=str, allow_none=False, help="a name for the resource"),
+            cmd = Field(kind=str, allow_none=False, help="the command to run while planning")
+        )
+
+    def default_provider(self):
+        return ProbeProvider
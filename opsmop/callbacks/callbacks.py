@@ -12,12 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 from opsmop.core.common import Singleton
 
 # TODO: __getattr__ this beast and eliminate all of these methods
 
 class Callbacks(metaclass=Singleton):
 
+    # resources may execute on worker threads (see Role.parallel), keep each event whole
+    _lock = threading.RLock()
+
     def set_callbacks(self, callbacks):
         self._callbacks = callbacks
         self._hostname_length = 0
@@ -32,10 +37,11 @@ class Callbacks(metaclass=Singleton):
         """ 
         Run a named callback method against all attached callback classes, in order.
         """
-        for c in self._callbacks:
-            attr = getattr(c, cb_method, None)
-            if attr:
-                attr(*args)
+        with self._lock:
+            for c in self._callbacks:
+                attr = getattr(c, cb_method, None)
+                if attr:
+                    attr(*args)
 
     def on_apply(self, provider):
         self._run_callbacks('on_apply', provider)
@@ -49,6 +55,12 @@ class Callbacks(metaclass=Singleton):
     def on_plan(self, provider):
         self._run_callbacks('on_plan', provider)
 
+    def on_plan_cached(self, provider):
+        self._run_callbacks('on_plan_cached', provider)
+
+    def on_batch(self, providers):
+        self._run_callbacks('on_batch', providers)
+
     def on_command_echo(self, provider, value):
         self._run_callbacks('on_command_echo', provider, value)
 
@@ -96,6 +108,9 @@ class Callbacks(metaclass=Singleton):
     def on_validate(self):
         self._run_callbacks('on_validate')
 
+    def on_trace(self, spans):
+        self._run_callbacks('on_trace', spans)
+
     def on_host_exception(self, host, exc):
         # is this needed?
         self._run_callbacks('on_failed_host', host, exc)
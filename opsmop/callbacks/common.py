@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect
-import json
 import sys
 
 from opsmop.callbacks.callback import BaseCallbacks
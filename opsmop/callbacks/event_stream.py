@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect
-import json
 import sys
 
 from opsmop.callbacks.callback import BaseCallbacks
@@ -62,6 +60,9 @@ class EventStreamCallbacks(BaseCallbacks):
     def on_complete(self, policy):
         self.event('complete', policy=policy)
 
+    def on_trace(self, spans):
+        self.event('trace', data=spans)
+
     def event(self, name, **kwargs):
         data = dict()
         data['evt'] = name
@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect
-import json
 import logging
 import logging.handlers
 import os
@@ -67,9 +65,17 @@ class LocalCliCallbacks(BaseCallbacks):
 
     def on_plan(self, provider):
         self.i3("planning")
+
+    def on_plan_cached(self, provider):
+        self.i3("unchanged since last run, skipping plan")
  
     def on_apply(self, provider):
         return
+
+    def on_batch(self, providers):
+        self.i1("")
+        self.banner("applying together: %s" % ", ".join([ str(p.resource) for p in providers ]))
+        self.i1("")
     
     def on_needs(self, provider, action):
         if provider.skip_plan_stage():
@@ -98,7 +104,8 @@ class LocalCliCallbacks(BaseCallbacks):
 
     def on_skipped(self, skipped, is_handler=False):
         if self.phase != 'validate' and not is_handler and issubclass(type(skipped), Type):
-            self.i3("skipped")
+            self.i1("")
+            self.i1("skipped: %s" % skipped)
 
     def on_begin_role(self, role):
         self.phase = 'resource'
@@ -14,6 +14,7 @@
 
 from opsmop.callbacks.callback import BaseCallbacks
 from opsmop.core.context import Context
+from opsmop.core.tracer import Tracer
 
 from colorama import Fore, Back, Style
 
@@ -62,6 +63,9 @@ class ReplayCallbacks(BaseCallbacks):
     def on_default(self, host, evt):
         pass
 
+    def on_trace(self, host, evt):
+        Tracer().add(evt['data'], host=host.name)
+
     def on_fatal(self, host, evt):
         self.info(host, "failed", foreground=Fore.RED)
 
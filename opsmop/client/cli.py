@@ -17,15 +17,14 @@ import argparse
 import os
 import sys
 
-from colorama import init as colorama_init
 
 from opsmop.callbacks.callbacks import Callbacks
 from opsmop.callbacks.common import CommonCallbacks
-from opsmop.callbacks.event_stream import EventStreamCallbacks
 from opsmop.callbacks.local import LocalCliCallbacks
 from opsmop.core.api import Api
 from opsmop.core.context import Context
 from opsmop.core.errors import OpsMopError, OpsMopStop
+from opsmop.core.tracer import Tracer
 from opsmop.core.common import load_data_file, shlex_kv
 
 USAGE = """
@@ -58,10 +57,25 @@ class Cli(object):
             data = shlex_kv(extra_vars)
         return data
  
+    def write_trace(self, path):
+        tracer = Tracer()
+        tracer.export(path)
+        for line in tracer.summary():
+            print(line)
+        print("")
+        print("trace written to %s" % path)
+
+    def profile_startup(self):
+        # runs the command again (without this option) in a child process, see opsmop.client.startup
+        from opsmop.client.startup import StartupProfile
+        profile = StartupProfile([ x for x in sys.argv if x != '--startup-profile' ])
+        rc = profile.run()
+        for line in profile.summary():
+            print(line)
+        sys.exit(rc)
+
     def go(self):
 
-        colorama_init()
-       
         if len(self.args) < 3 or sys.argv[1] == "--help":
             print(USAGE)
             sys.exit(1)
@@ -82,8 +96,13 @@ class Cli(object):
         parser.add_argument('--extra-vars', help="add extra variables from the command line")
         parser.add_argument('--limit-groups', help="(with --push) limit groups executed to this comma-separated list of patterns")
         parser.add_argument('--limit-hosts', help="(with --push) limit hosts executed to this comma-separated list of patterns")
+        parser.add_argument('--trace', help="write a Chrome trace of the run to this file and show the slowest resources and hosts")
+        parser.add_argument('--startup-profile', action='store_true', help="show how long importing each module took")
         args = parser.parse_args(self.args[1:])
 
+        if args.startup_profile:
+            self.profile_startup()
+
         all_modes = [ args.validate, args.apply, args.check ]
         selected_modes = [ x for x in all_modes if x is True ]
         if len(selected_modes) != 1:
@@ -100,9 +119,20 @@ class Cli(object):
         if args.extra_vars is not None:
             extra_vars = self.handle_extra_vars(args.extra_vars)
 
+        if args.push:
+            # only push mode output (see ReplayCallbacks) is colored
+            from colorama import init as colorama_init
+            colorama_init()
+
         Callbacks().set_callbacks([ LocalCliCallbacks(), CommonCallbacks() ])
         Context().set_verbose(args.verbose)
 
+        trace_path = None
+        if args.trace is not None:
+            # relative to where we were run from, before changing directory below
+            trace_path = os.path.abspath(args.trace)
+            Tracer().enable()
+
         abspath = os.path.abspath(sys.modules[self.policy.__module__].__file__)
         relative_root = os.path.dirname(abspath)
         os.chdir(os.path.dirname(abspath))
@@ -140,6 +170,9 @@ class Cli(object):
             print(str(ome))
             print("")
             sys.exit(1)
+        finally:
+            if trace_path is not None:
+                self.write_trace(trace_path)
 
 
         print("")
@@ -0,0 +1,90 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import subprocess
+import sys
+import time
+
+# how many of the slowest modules to show
+SHOW = 25
+
+class StartupProfile(object):
+
+    """
+    Reports how long importing each module took for one run of the CLI.  Imports happen once
+    per process, before the command line is even parsed, so this runs the same command again
+    in a child Python with -X importtime and reads what that prints to stderr.
+    """
+
+    __slots__ = [ '_argv', '_modules', '_elapsed' ]
+
+    def __init__(self, argv):
+        self._argv = argv
+        # (name, self microseconds, cumulative microseconds, depth) in import order
+        self._modules = []
+        self._elapsed = 0
+
+    def run(self):
+        """
+        Runs the command and returns its exit code.  Output of the command is passed through.
+        """
+        cmd = [ sys.executable, '-X', 'importtime' ] + self._argv
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, universal_newlines=True)
+        for line in proc.stderr:
+            if not self._parse(line):
+                sys.stderr.write(line)
+        rc = proc.wait()
+        self._elapsed = time.perf_counter() - start
+        return rc
+
+    def _parse(self, line):
+        # import time:       536 |     119466 |   opsmop.core.easy
+        if not line.startswith("import time:"):
+            return False
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # the header line
+            return True
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        self._modules.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+        return True
+
+    def by_package(self):
+        """
+        Returns (top level package, milliseconds) for all imports, slowest first.
+        """
+        totals = dict()
+        for (name, own, cumulative, depth) in self._modules:
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0) + own
+        return sorted([ (k, v / 1000.0) for (k, v) in totals.items() ], key=lambda x: x[1], reverse=True)
+
+    def summary(self):
+        """
+        Returns the lines of the report.
+        """
+        total = sum([ m[1] for m in self._modules ]) / 1000.0
+        results = [ "", "startup profile: %.1f ms importing %s modules, %.1f ms for the whole run" % (total, len(self._modules), self._elapsed * 1000), "" ]
+        results.append("    %10s %10s  %s" % ("self ms", "total ms", "module"))
+        slowest = sorted(self._modules, key=lambda m: m[1], reverse=True)[:SHOW]
+        for (name, own, cumulative, depth) in slowest:
+            results.append("    %10.1f %10.1f  %s" % (own / 1000.0, cumulative / 1000.0, name))
+        results.append("")
+        results.append("    %10s  %s" % ("ms", "package"))
+        for (package, ms) in self.by_package()[:SHOW]:
+            results.append("    %10.1f  %s" % (ms, package))
+        return results
@@ -1,6 +1,6 @@
 import os
-import toml
 from opsmop.core.common import memoize
+from opsmop.core.output import EXCERPT_HEAD, EXCERPT_TAIL, MEMORY_LIMIT
 import getpass
 
 @memoize
@@ -23,6 +23,7 @@ class UserDefaults(object):
         f1 = os.path.expanduser(os.path.expandvars(LOCAL_CONFIG))
         f2 = GLOBAL_CONFIG
         data = dict()
+        import toml
         if os.path.exists(f1):
             return toml.load(f1)
         elif os.path.exists(f2):
@@ -73,7 +74,51 @@ class UserDefaults(object):
     def max_workers(cls):
         # number of simultaneous workers during connection attempts
         return cls._extract('tuning', 'max_workers', 16)
+
+    @classmethod
+    def max_commands(cls):
+        # number of commands a provider may run at once, see opsmop.core.engine
+        return cls._extract('tuning', 'max_commands', 8)
+
+    @classmethod
+    def fork_server(cls):
+        # start commands from a small helper process instead of forking this one, see opsmop.core.engine
+        return cls._extract('tuning', 'fork_server', False)
+
+    @classmethod
+    def limits(cls):
+        # limits for every command run on this host, see opsmop.core.limits
+        return cls.settings().get('limits', dict())
+
+    @classmethod
+    def cgroup_root(cls):
+        # the cgroup (v2) that cgroups for commands with memory_max or cpu_max are made in
+        return cls._extract('tuning', 'cgroup_root', '/sys/fs/cgroup/opsmop')
         
+    @classmethod
+    def plan_cache_path(cls):
+        # the plan cache is off unless enabled, None means disabled
+        if not cls._extract('cache', 'plan_cache', False):
+            return None
+        return os.path.expanduser(cls._extract('cache', 'path', '~/.opsmop/plan_cache.json'))
+
+    @classmethod
+    def validation_cache_path(cls):
+        # used on the controller (or in local mode), None means disabled
+        if not cls._extract('cache', 'validation_cache', False):
+            return None
+        return os.path.expanduser(cls._extract('cache', 'validation_path', '~/.opsmop/validation_cache.json'))
+
+    @classmethod
+    def output_memory_limit(cls):
+        # command output past this many characters is kept in a temporary file, see opsmop.core.output
+        return cls._extract('output', 'memory_limit', MEMORY_LIMIT)
+
+    @classmethod
+    def output_excerpt(cls):
+        # how much of the start and end of long command output results show, see opsmop.core.output
+        return (cls._extract('output', 'excerpt_head', EXCERPT_HEAD), cls._extract('output', 'excerpt_tail', EXCERPT_TAIL))
+
     @classmethod
     def log_path(cls):
         return os.path.expanduser(cls._extract('log', 'path', '~/.opsmop/opsmop.log'))
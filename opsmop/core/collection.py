@@ -15,7 +15,6 @@
 from opsmop.core.field import Field
 from opsmop.core.fields import Fields
 from opsmop.core.resource import Resource
-from opsmop.callbacks.callbacks import Callbacks
 
 
 class Collection(Resource):
@@ -39,6 +38,8 @@ class Collection(Resource):
     Collection(*resource_list, when=is_os_x)
     """
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         self.setup(items=args, **kwargs)
 
@@ -78,60 +79,18 @@ class Collection(Resource):
     def walk_children(self, items=None, which=None, fn=None, handlers=False, tags=None):
 
         """
-        A relatively complex iterator used by Executor() code.
-        Walks the entire object tree calling fn() on each element.
+        Walks the object tree below this collection calling fn() on each leaf resource
+        whose conditions are true.  The Executor runs precompiled Programs instead, see
+        opsmop.core.compiler.
 
         items - the kids to start the iteration with
-        context - a Context() object for callback tracking
-        which - 'resources' or 'handlers'
+        which - 'resources' or 'handlers' (unused, kept for compatibility)
         fn - the function to call on each object
         """
 
+        from opsmop.core.compiler import Program
+
         self._on_walk()
-        items_type = type(items)
-
-        if items is None:
-            return
-
-        def maybe(v):
-            # we'll visit every resource but only call the function on items if tags are *not* engaged
-            if not tags or v.has_tag(tags):
-                fn(v)
-
-        if issubclass(items_type, Collection):
-            self.attach_child_scope_for(items)
-            proceed = items.conditions_true()
-            if proceed:
-                return items.walk_children(items=items.get_children(), which=which, fn=fn, tags=tags)
-            else:
-                Callbacks().on_skipped(items, is_handler=handlers)
-
-        elif issubclass(items_type, Resource):
-            self.attach_child_scope_for(items)
-            if items.conditions_true():
-                return maybe(items)
-            else:
-                Callbacks().on_skipped(items, is_handler=handlers)
-
-        elif items_type == list:
-            for x in items:
-                self.attach_child_scope_for(x)
-                if x.conditions_true():
-                    if issubclass(type(x), Collection):
-                        x.walk_children(items=x.get_children(), fn=fn, tags=tags)
-                    else:
-                        maybe(x)
-                else:
-                    Callbacks().on_skipped(items, is_handler=handlers)
-
-        elif items_type == dict:
-            for (k,v) in items.items():
-                self.attach_child_scope_for(v)
-                if v.conditions_true():
-                    if issubclass(type(v), Collection):
-                        items.walk_children(items=v.get_children(),which=which, fn=fn, tags=tags)
-                    else:
-                        v.handles = k
-                        maybe(v)
-                else:
-                    Callbacks().on_skipped(items, is_handler=handlers)
+        program = Program.compile(items, tags=self.all_tags(), handles=self.all_handles())
+        for step in program.run(self, tags=tags, handlers=handlers):
+            fn(step.resource)
@@ -12,15 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import codecs
 import io
 import os
-import shutil
-import subprocess
+import time
 
 from opsmop.callbacks.callbacks import Callbacks
-from opsmop.core.common import memoize
+from opsmop.client.user_defaults import UserDefaults
+from opsmop.core.engine import TIMEOUT_GRACE, CommandEngine
+from opsmop.core.limits import Limits
+from opsmop.core.output import OutputBuffer
 from opsmop.core.result import Result
+from opsmop.core.tracer import Tracer
 
+# the return code of a command that ran out of time, as timeout(1) reports it
+TIMEOUT_RC = 124
 
 class Command(object):
 
@@ -41,7 +48,7 @@ class Command(object):
         provider: a required reference to the provider class. The Command() class cannot be used seperately.
         env: an optional dict of environment variables to pass to the calling command
         input_text: any text to feed to standard input, if any
-        timeout: the command will be killed after this many seconds
+        timeout: the command, and anything it started, will be killed after this many seconds
         echo: whether to show the command names + return codes + output on the screen using whatever callback class is set in the system
         fatal: whether any errors should fail the resource execution
         loud: whether to ignore 'quiet' preferences for just the output (but not command name or return codes)
@@ -62,87 +69,151 @@ class Command(object):
     def to_dict(self):
         return dict(cls=self.__class__.__name__, cmd=self.cmd, timeout=self.timeout, env=self.env)
 
-    @memoize
-    def get_timeout(self):
-        """
-        Returns the name of the timeout command, if present
-        """
-        t1 = shutil.which('timeout')
-        if t1:
-            return t1
-        t2 = shutil.which('gtimeout')
-        if t2:
-            return t2
-        return None
-
-
     def execute(self):
         """
         Execute a command (a list or string) with input_text as input, appending
-        the output of all commands to the build log.
+        the output of all commands to the build log.  This waits for execute_async().
 
         This code was derived from http://vespene.io/ though is slightly different
         because there are no database objects.
         """
+        return CommandEngine().run(self.execute_async())
+
+    async def execute_async(self):
+        """
+        Like execute(), but may run alongside other commands, see opsmop.core.engine.
+        """
 
         Callbacks().on_execute_command(self.provider, self)
         
         command = self.cmd
-        timeout_cmd = self.get_timeout()
-
-        shell = True
-        if type(command) == list:
-            if self.timeout and timeout_cmd:
-                command.insert(0, str(self.timeout))
-                command.insert(0, timeout_cmd)
-            shell = False
-        else:
-            if self.timeout and timeout_cmd:
-                command = "%s %s %s" % (timeout_cmd, self.timeout, command)
+        shell = type(command) != list
 
         # keep SSH-agent working for executed commands
         sock = os.environ.get('SSH_AUTH_SOCK', None)
         if self.env and sock:
             self.env['SSH_AUTH_SOCK'] = sock
 
-        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=shell, env=self.env)
-
         if self.input_text is None:
             self.input_text = ""
 
-        stdin = io.TextIOWrapper(
-            process.stdin,
-            encoding='utf-8',
-            line_buffering=True,
-        )
-        stdout = io.TextIOWrapper(
-            process.stdout,
-            encoding='utf-8',
-        )
-        stdin.write(self.input_text)
-        stdin.close()
-
-        output = ""
-        for line in stdout:
-            if (self.echo or self.loud) and (not self.ignore_lines or not self.should_ignore(line)):
-                Callbacks().on_command_echo(self.provider, line)
-            output = output + line
-        if output.strip() == "":
-            Callbacks().on_command_echo(self.provider, "(no output)")
-
-
-        process.wait()
+        resource = self.provider.resource
+        limits = Limits.for_resource(resource) if resource is not None else UserDefaults.limits()
+
+        engine = CommandEngine()
+        async with engine.slots():
+            with Tracer().span(self.cmd, 'command'):
+                start = time.monotonic()
+                # the command gets a process group of its own, so a timeout stops everything it started
+                process = await engine.spawn(command, shell=shell, env=self.env, limits=limits)
+                applied = getattr(process, 'limits', None) if limits else None
+
+                # feed input while reading output, so neither side can fill a pipe and stall
+                feeder = engine.write(process.stdin, self.input_text.encode('utf-8'))
+                if feeder is not None:
+                    feeder = asyncio.ensure_future(feeder)
+                (head, tail) = UserDefaults.output_excerpt()
+                output = OutputBuffer(limit=UserDefaults.output_memory_limit(), head=head, tail=tail)
+                communicate = asyncio.ensure_future(self._communicate(engine, process, output))
+                (done, _) = await asyncio.wait([ communicate ], timeout=self.timeout or None)
+                timed_out = not done
+                if timed_out:
+                    await engine.terminate(process)
+                    # keep what the group wrote while stopping, unless something outside it holds the pipe
+                    (done, _) = await asyncio.wait([ communicate ], timeout=TIMEOUT_GRACE)
+                    if not done:
+                        communicate.cancel()
+                        await asyncio.wait([ communicate ])
+                    if feeder is not None:
+                        feeder.cancel()
+                    rc = TIMEOUT_RC
+                else:
+                    rc = communicate.result()
+                    if feeder is not None:
+                        await feeder
+                elapsed = time.monotonic() - start
+
+                if output.is_blank():
+                    Callbacks().on_command_echo(self.provider, "(no output)")
+                if timed_out:
+                    Callbacks().on_command_echo(self.provider, "(timed out after %s seconds)" % self.timeout)
+                missing = Limits.missing(limits, applied) if limits else None
+                if missing:
+                    Callbacks().on_command_echo(self.provider, "(limits not applied: %s)" % ", ".join(missing))
 
         res = None
-        rc = process.returncode
         if rc != 0:
-            res = Result(self.provider, rc=rc, data=output, fatal=self.fatal, primary=self.primary)
+            res = Result(self.provider, rc=rc, data=output, fatal=self.fatal, primary=self.primary, elapsed=elapsed, timed_out=timed_out, limits=applied)
         else:
-            res = Result(self.provider, rc=rc, data=output, fatal=False, primary=self.primary)
+            res = Result(self.provider, rc=rc, data=output, fatal=False, primary=self.primary, elapsed=elapsed, limits=applied)
         # this callback will, depending on implementation, usually note fatal result objects and raise an exception
         Callbacks().on_command_result(self.provider, res)
         return res
 
+    async def _communicate(self, engine, process, output):
+        """
+        Collects the output of the process, echoing it to callbacks, and returns its return code.
+        Output is stored as it is read, and only split into lines when it is echoed.
+        """
+        echo = self.echo or self.loud
+        # the start of a line being echoed, when its end has not been read yet
+        parts = []
+        try:
+            async for text in self._text(engine, process.stdout):
+                output.write(text)
+                if echo:
+                    self._echo_lines(text, parts)
+        finally:
+            process.stdout.close()
+            output.close()
+        if parts:
+            self._echo_line("".join(parts))
+        return await engine.wait(process)
+
+    async def _text(self, engine, stdout):
+        """
+        Yields the output of the process as it is read, decoded, with newlines translated as for
+        text files.
+        """
+        decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+        final = False
+        while not final:
+            chunk = await engine.read(stdout)
+            final = not chunk
+            text = decoder.decode(chunk, final=final)
+            if text:
+                yield text
+
+    def _echo_lines(self, text, parts):
+        """
+        Echoes each line that ends in text.  parts holds the start of a line that began in
+        earlier output and is added to with whatever of text does not end a line.  Lines of any
+        length are fine, and a long line is not copied more than once.
+        """
+        echo = Callbacks().on_command_echo
+        provider = self.provider
+        ignore = self.ignore_lines
+        start = 0
+        while True:
+            end = text.find("\n", start)
+            if end < 0:
+                break
+            if parts:
+                parts.append(text[start:end+1])
+                line = "".join(parts)
+                parts.clear()
+            else:
+                line = text[start:end+1]
+            if not ignore or not self.should_ignore(line):
+                echo(provider, line)
+            start = end + 1
+        if start < len(text):
+            parts.append(text[start:])
+
+    def _echo_line(self, line):
+        if not self.ignore_lines or not self.should_ignore(line):
+            Callbacks().on_command_echo(self.provider, line)
+
     def should_ignore(self, line):
         # used for ignoring output on the console like "(Reading database 20% ...)" which is common for 'apt'
         # this may be modified to also do regular expressions in the future.
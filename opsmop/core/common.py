@@ -16,10 +16,6 @@ import functools
 import os
 import shlex
 
-import toml
-import yaml
-import json
-
 # while we want to keep this miminal, the common class contains some useful functions usable by many providers.
 
 class Singleton(type):
@@ -58,12 +54,16 @@ def load_data_file(path):
     path = os.path.abspath(os.path.expanduser(os.path.expandvars(path)))
     if not os.path.exists(path):
         raise Exception("path does not exist: %s" % path)
+    # parsers are imported here so that runs without data files do not load them
     if path.endswith(".toml"):
+        import toml
         return toml.load(path)
     elif path.endswith(".json"):
+        import json
         fd = open(path)
         return json.loads(fd.read())
     elif path.endswith(".yaml"):
+        import yaml
         fd = open(path)
         data = yaml.safe_load(fd.read())
         return data
@@ -0,0 +1,287 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import copy
+
+from opsmop.callbacks.callbacks import Callbacks
+from opsmop.core.collection import Collection
+from opsmop.core.handlers import Handlers
+from opsmop.core.resource import Resource
+from opsmop.core.resources import Resources
+from opsmop.core.roles import Roles
+
+# marks the end of a collection's children while compiling
+_CLOSE = object()
+
+def _detached(resource, **values):
+    """
+    Returns a shallow copy of a resource with some field values replaced.  The copy holds no
+    references back to the original, and so none to the rest of the tree the original is in.
+    """
+    clone = copy.copy(resource)
+    clone.kwargs = resource.kwargs.copy()
+    clone._values = resource._values.copy()
+    for (k, v) in values.items():
+        setattr(clone, k, v)
+        if k in clone.kwargs:
+            clone.kwargs[k] = v
+    clone._scope = None
+    return clone
+
+class Step(object):
+
+    """
+    One resource in a compiled Program.
+    """
+
+    __slots__ = [ 'resource', 'parent', 'end', 'leaf', 'tags', 'handles', 'joins' ]
+
+    def __init__(self, resource, parent, tags, handles):
+        self.resource = resource
+        # index of the step whose scope this step's scope is created from, -1 for the root
+        self.parent = parent
+        # index just past this step's subtree, where to continue if its condition is false
+        self.end = None
+        self.leaf = not issubclass(type(resource), Collection)
+        # every tag and handler name on the path from the policy down to this resource
+        self.tags = tags
+        self.handles = frozenset(handles)
+        # True if this step may be processed in one batch with the step before it, see Program.batches
+        self.joins = False
+
+    def can_join(self, previous):
+        """
+        Whether this step may be batched with the previous step.  The steps of a batch are set up
+        before any of them runs, so only the first may have a condition and none but the last may
+        change variables.
+        """
+        if not (self.leaf and previous.leaf) or self.parent != previous.parent:
+            return False
+        resource = self.resource
+        key = resource.batch_key()
+        if key is None or key != previous.resource.batch_key():
+            return False
+        if resource.when is not None or type(resource).should_process_when is not Resource.should_process_when:
+            return False
+        return not previous.resource.is_barrier()
+
+    def has_tag(self, tags):
+        if 'any' in self.tags:
+            return True
+        for t in tags:
+            if t in self.tags:
+                return True
+        return False
+
+
+class Program(object):
+
+    """
+    A Program is a resource tree flattened into a list of Steps in execution order.  Tags
+    and handler names are worked out once when compiling, and running a Program is a loop
+    rather than a recursion, so deeply nested collections are not limited by stack depth.
+    """
+
+    __slots__ = [ 'steps', 'tag_index', 'pruned' ]
+
+    def __init__(self, steps, pruned=False):
+        self.steps = steps
+        # True if this Program was cut down by select(), and so may not hold every resource
+        self.pruned = pruned
+        # maps each tag to the indexes of the leaf steps carrying it
+        self.tag_index = dict()
+        for (i, step) in enumerate(steps):
+            if step.leaf:
+                for tag in step.tags:
+                    self.tag_index.setdefault(tag, []).append(i)
+            step.joins = i > 0 and step.can_join(steps[i-1])
+
+    @classmethod
+    def compile(cls, items, tags=None, handles=None):
+        """
+        Compile items (a Collection, Resource, list, or dict of handlers) into a Program.
+        tags and handles are those inherited from the resources above items.
+        """
+        steps = []
+        todo = [ (items, -1, frozenset(tags or []), frozenset(handles or [])) ]
+        while todo:
+            entry = todo.pop()
+            if entry[0] is _CLOSE:
+                steps[entry[1]].end = len(steps)
+                continue
+            (item, parent, tags, handles) = entry
+            if item is None:
+                continue
+            if type(item) == list:
+                for x in reversed(item):
+                    todo.append((x, parent, tags, handles))
+                continue
+            if type(item) == dict:
+                for (k, v) in reversed(list(item.items())):
+                    v.handles = k
+                    todo.append((v, parent, tags, handles))
+                continue
+            if item.tags:
+                tags = tags.union(item.tags)
+            if item.handles:
+                handles = handles.union([ item.handles ])
+            step = Step(item, parent, tags, handles)
+            index = len(steps)
+            steps.append(step)
+            if step.leaf:
+                step.end = index + 1
+            else:
+                todo.append((_CLOSE, index))
+                todo.append((item.get_children(), index, tags, handles))
+        return cls(steps)
+
+    def run(self, root, tags=None, handlers=False):
+        """
+        Yields the leaf Steps that should execute, in order.  Each resource is given a scope
+        below its parent's (the root resource's scope for the top level) and resources whose
+        conditions are false are skipped along with everything they contain.  Conditions are
+        evaluated as the caller asks for the next step, so earlier steps can change variables.
+        """
+        for batch in self.batches(root, tags=tags, handlers=handlers, join=False):
+            yield batch[0]
+
+    def batches(self, root, tags=None, handlers=False, join=True):
+        """
+        Like run(), but yields lists of Steps.  Sibling leaves next to each other with the same
+        batch key (see Resource.batch_key) come in one list, so they can share commands.  Whether
+        a step joins the list is known before its condition is evaluated, and a list is yielded
+        before the condition of any step after it, so conditions still see the effects of
+        everything before them.
+        """
+        steps = self.steps
+        count = len(steps)
+        scopes = [ None ] * count
+        root_scope = root.scope()
+        batch = []
+        i = 0
+        while i < count:
+            step = steps[i]
+            if batch and not (join and step.joins):
+                yield batch
+                batch = []
+            resource = step.resource
+            if step.parent < 0:
+                parent_scope = root_scope
+            else:
+                parent_scope = scopes[step.parent]
+            scope = parent_scope.deeper_scope_for(resource)
+            resource.set_scope(scope)
+            scopes[i] = scope
+            if not resource.conditions_true():
+                Callbacks().on_skipped(resource, is_handler=handlers)
+                i = step.end
+                continue
+            if step.leaf and (not tags or step.has_tag(tags)):
+                batch.append(step)
+            i = i + 1
+        if batch:
+            yield batch
+
+    def select(self, tags):
+        """
+        Returns a Program holding only the leaves that match tags and the collections above
+        them, found through the tag index.  Subtrees without a matching leaf are left out, so
+        running the result allocates no scopes and evaluates no conditions for them.  The
+        collections kept are copies whose items are only the children that were kept.
+        """
+        steps = self.steps
+        keep = set()
+        for tag in list(tags) + [ 'any' ]:
+            for i in self.tag_index.get(tag, []):
+                while i >= 0 and i not in keep:
+                    keep.add(i)
+                    i = steps[i].parent
+        kept = sorted(keep)
+        remap = { old: new for (new, old) in enumerate(kept) }
+        results = []
+        for old in kept:
+            step = steps[old]
+            new = Step(step.resource, remap.get(step.parent, -1), step.tags, step.handles)
+            if new.leaf:
+                new.end = len(results) + 1
+            else:
+                new.end = bisect.bisect_left(kept, step.end)
+            results.append(new)
+        # children come after their parents, so going backwards every collection's kept
+        # children have been copied by the time the collection itself is
+        children = dict()
+        for i in range(len(results) - 1, -1, -1):
+            step = results[i]
+            if not step.leaf:
+                step.resource = _detached(step.resource, items=children.pop(i, []))
+            children.setdefault(step.parent, []).insert(0, step.resource)
+        return Program(results, pruned=True)
+
+
+class CompiledRole(object):
+
+    """
+    The resource and handler Programs of one role.
+    """
+
+    __slots__ = [ 'resources', 'handlers' ]
+
+    def __init__(self, resources, handlers):
+        self.resources = resources
+        self.handlers = handlers
+
+    def detach(self, policy, role):
+        """
+        Returns copies of the policy and role without their resource trees.  In push mode
+        these are sent along with the CompiledRole, which is all a remote Executor needs.
+        """
+        policy = _detached(policy, roles=Roles())
+        role = _detached(role, resources=Resources(), handlers=Handlers())
+        return (policy, role)
+
+
+class Compiler(object):
+
+    """
+    Turns the roles of a Policy into CompiledRoles.  This is done once per policy, and in push
+    mode the results are sent to each host along with the policy.  When tags are given, the
+    Programs only hold the resources selected by those tags.
+    """
+
+    __slots__ = [ 'tags' ]
+
+    def __init__(self, tags=None):
+        self.tags = tags
+
+    def compile_role(self, policy, role):
+        tags = []
+        handles = []
+        for resource in (policy, role):
+            if resource.tags:
+                tags.extend(resource.tags)
+            if resource.handles:
+                handles.append(resource.handles)
+        resources = Program.compile(role.get_children('resources'), tags=tags, handles=handles)
+        handlers = Program.compile(role.get_children('handlers'), tags=tags, handles=handles)
+        if self.tags:
+            resources = resources.select(self.tags)
+            handlers = handlers.select(self.tags)
+        return CompiledRole(resources=resources, handlers=handlers)
+
+    def compile(self, policy):
+        """
+        Returns a dict of role objects to CompiledRoles.
+        """
+        return { role: self.compile_role(policy, role) for role in policy.get_roles().items }
@@ -0,0 +1,93 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import collections
+import threading
+
+from opsmop.core.common import Singleton
+from opsmop.core.context import Context
+from opsmop.core.scope import Scope
+from opsmop.core.template import Template
+
+# how many distinct condition results to remember
+CACHE_SIZE = 4096
+
+class ConditionCache(metaclass=Singleton):
+
+    """
+    Remembers the results of Eval expressions (when=, failed_when=, changed_when=) so that
+    many resources guarded by the same expression only evaluate it once.
+
+    A result is reused only if, for every variable the expression refers to, the same scope
+    layer still defines it and the variable has not been set or registered since.  Changes to
+    globals or extra vars invalidate everything, as does any provider taking actions when the
+    expression uses facts, since the host may now answer differently.  Expressions that use
+    volatile facts (such as Chaos) are never cached.
+    """
+
+    __slots__ = [ '_results', '_facts_version', '_hits', '_misses', '_lock' ]
+
+    def __init__(self):
+        self._results = collections.OrderedDict()
+        self._facts_version = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def invalidate_facts(self):
+        """
+        Called by the Executor whenever a provider has taken actions.
+        """
+        self._facts_version = self._facts_version + 1
+
+    def _key(self, expr, resource):
+        scope = resource.scope()
+        if scope is None:
+            return None
+        facts = resource.fact_context()
+        uses_facts = False
+        owners = []
+        for name in sorted(Template.native_names(expr)):
+            fact = facts.get(name, None)
+            if fact is not None:
+                if getattr(fact, 'volatile', False):
+                    return None
+                uses_facts = True
+            owners.append((scope.owner(name), Scope.name_version(name)))
+        facts_version = self._facts_version if uses_facts else None
+        return (expr, Context().variables_version(), facts_version, tuple(owners))
+
+    def evaluate(self, expr, resource):
+        """
+        Returns Template.native_eval(expr, resource), from the cache where possible.
+        """
+        key = self._key(expr, resource)
+        if key is None:
+            return Template.native_eval(expr, resource)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._hits = self._hits + 1
+                return self._results[key]
+        result = Template.native_eval(expr, resource)
+        with self._lock:
+            self._misses = self._misses + 1
+            self._results[key] = result
+            if len(self._results) > CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+    def cache_info(self):
+        return dict(hits=self._hits, misses=self._misses, size=len(self._results))
@@ -20,7 +20,7 @@ APPLY = 'apply'
 
 class Context(metaclass=Singleton):
 
-    __slots__ = [ '_host', '_host_failures', '_host_signals', '_relative_root', '_mode', '_caller', '_verbose', '_role', '_checksums', '_globals', '_extra_vars' ]
+    __slots__ = [ '_host', '_host_failures', '_host_signals', '_relative_root', '_mode', '_caller', '_verbose', '_role', '_checksums', '_globals', '_extra_vars', '_variables_version', '_host_state_version' ]
 
     def __init__(self):
         self._host = None
@@ -33,9 +33,12 @@ class Context(metaclass=Singleton):
         self._checksums = dict()
         self._extra_vars = dict()
         self._globals = dict()
+        self._variables_version = 0
+        self._host_state_version = 0
 
     def update_globals(self, variables):
         self._globals.update(variables)
+        self._variables_version = self._variables_version + 1
 
     def globals(self):
         return self._globals
@@ -52,6 +55,22 @@ class Context(metaclass=Singleton):
 
     def set_extra_vars(self, extra_vars):
         self._extra_vars = extra_vars
+        self._variables_version = self._variables_version + 1
+
+    def variables_version(self):
+        """ changes whenever globals or extra vars change """
+        return self._variables_version
+
+    def host_state_changed(self):
+        """ called by the Executor whenever a provider has taken actions """
+        self._host_state_version = self._host_state_version + 1
+
+    def host_state_version(self):
+        """
+        Changes whenever a provider has taken actions.  Caches of host state (see
+        opsmop.providers.service.systemd) compare it to tell when they may be out of date.
+        """
+        return self._host_state_version
 
     def extra_vars(self):
         return self._extra_vars
@@ -106,16 +125,21 @@ class Context(metaclass=Singleton):
         return self._mode == APPLY
 
     def add_signal(self, host, signal):
-
-        if not host.name in self._host_signals:
-            self._host_signals[host.name] = []
-        self._host_signals[host.name].append(signal)
+        """
+        Records that a handler name (or a list of them) was signaled on a host.
+        """
+        # setdefault keeps this safe when resources run in parallel (see Role.parallel)
+        host_signals = self._host_signals.setdefault(host.name, set())
+        if type(signal) == str:
+            host_signals.add(signal)
+        else:
+            host_signals.update(signal)
 
     def has_seen_any_signal(self, host, signals):
-
-        host_signals = self._host_signals.get(host.name, [])
-
-        for x in host_signals:
-            if x in signals:
-                return True
-        return False
+        """
+        True if any of the given handler names was signaled on the host.
+        """
+        host_signals = self._host_signals.get(host.name, None)
+        if not host_signals:
+            return False
+        return not host_signals.isdisjoint(signals)
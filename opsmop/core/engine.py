@@ -0,0 +1,446 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import errno
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+
+from opsmop.client.user_defaults import UserDefaults
+from opsmop.core import fork_server
+from opsmop.core.common import Singleton
+
+# how much output to read from a process at a time
+CHUNK_SIZE = 65536
+
+# how long a command has to exit after SIGTERM before it is sent SIGKILL
+TIMEOUT_GRACE = 5
+
+# start each command in a process group of its own
+if sys.version_info >= (3, 11):
+    NEW_GROUP = dict(process_group=0)
+else:
+    NEW_GROUP = dict(start_new_session=True)
+
+# shell commands made of only these characters, and not starting with a shell builtin or
+# keyword, mean the same thing without a shell, so the fork server starts them directly
+SIMPLE_COMMAND = re.compile(r'^[A-Za-z0-9_./:,+@=-]+([ \t]+[A-Za-z0-9_./:,+@=-]+)*$')
+SHELL_WORDS = set("""
+    . : alias bg break case cd command continue do done elif else esac eval exec exit export fc fg
+    fi for getopts hash if in jobs kill local pwd read readonly return select set shift source then
+    time times trap type ulimit umask unalias unset until wait while
+""".split())
+
+def simple_argv(command):
+    """
+    Returns the argv a shell would run for a command string, or None if the command needs a shell.
+    """
+    if not SIMPLE_COMMAND.match(command):
+        return None
+    argv = command.split()
+    if argv[0] in SHELL_WORDS or '=' in argv[0]:
+        return None
+    return argv
+
+class ServedProcess(object):
+
+    """
+    A command started by a ForkServer, with the parts of subprocess.Popen the engine uses.
+    """
+
+    __slots__ = [ 'pid', 'stdin', 'stdout', 'returncode', 'limits', '_exited' ]
+
+    def __init__(self, pid, stdin, stdout, exited, limits=None):
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.returncode = None
+        # the limits applied to the process, if any were asked for
+        self.limits = limits
+        self._exited = exited
+
+    def poll(self):
+        if self.returncode is None and self._exited.done():
+            self.returncode = self._exited.result()
+        return self.returncode
+
+class ForkServer(object):
+
+    """
+    A small helper process (opsmop.core.fork_server) that starts commands for one event loop.  It
+    is used for commands with limits, and for every command if enabled.  If the helper goes away,
+    pending commands fail and the engine goes back to starting commands itself.
+    """
+
+    __slots__ = [ '_loop', '_sock', '_process', '_pending', '_next' ]
+
+    def __init__(self, loop):
+        (ours, theirs) = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            # the source is passed rather than the path, which in push mode is not on the managed host
+            source = fork_server.__loader__.get_source(fork_server.__name__)
+            self._process = subprocess.Popen([ sys.executable, '-I', '-S', '-c', source, str(theirs.fileno()) ],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, pass_fds=[ theirs.fileno() ])
+        except OSError:
+            ours.close()
+            raise
+        finally:
+            theirs.close()
+        ours.setblocking(False)
+        self._loop = loop
+        self._sock = ours
+        self._pending = dict()
+        self._next = 0
+        loop.add_reader(ours.fileno(), self._receive)
+
+    def alive(self):
+        return self._sock is not None
+
+    async def spawn(self, argv, env, limits=None):
+        """
+        Starts argv, with limits (see opsmop.core.limits) if given, and returns a ServedProcess.
+        Raises OSError if it cannot be started.
+        """
+        (stdin_r, stdin_w) = os.pipe()
+        (stdout_r, stdout_w) = os.pipe()
+        self._next = self._next + 1
+        ident = self._next
+        request = dict(id=ident, argv=argv, env=env, cwd=os.getcwd())
+        if limits:
+            request['limits'] = limits
+            request['cgroup_root'] = UserDefaults.cgroup_root()
+        message = json.dumps(request).encode('utf-8')
+        started = self._loop.create_future()
+        exited = self._loop.create_future()
+        self._pending[ident] = (started, exited, argv)
+        try:
+            while True:
+                try:
+                    socket.send_fds(self._sock, [ message ], [ stdin_r, stdout_w ])
+                    break
+                except BlockingIOError:
+                    await CommandEngine()._ready(self._sock.fileno(), write=True)
+                except (BrokenPipeError, ConnectionResetError):
+                    del self._pending[ident]
+                    self._close()
+                    raise
+        except BaseException:
+            self._pending.pop(ident, None)
+            os.close(stdin_w)
+            os.close(stdout_r)
+            raise
+        finally:
+            os.close(stdin_r)
+            os.close(stdout_w)
+        try:
+            reply = await started
+        except BaseException:
+            os.close(stdin_w)
+            os.close(stdout_r)
+            raise
+        return ServedProcess(reply['pid'], open(stdin_w, 'wb', buffering=0), open(stdout_r, 'rb', buffering=0), exited, limits=reply['limits'])
+
+    def _receive(self):
+        while True:
+            try:
+                data = self._sock.recv(CHUNK_SIZE)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b''
+            if not data:
+                self._close()
+                return
+            message = json.loads(data)
+            (started, exited, argv) = self._pending[message['id']]
+            if 'pid' in message:
+                started.set_result(message)
+            elif 'error' in message:
+                del self._pending[message['id']]
+                started.set_exception(OSError(message['errno'], message['error'], argv[0]))
+                exited.cancel()
+            else:
+                del self._pending[message['id']]
+                exited.set_result(message['rc'])
+
+    def _close(self):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        for (started, exited, _) in self._pending.values():
+            for future in [ started, exited ]:
+                if not future.done():
+                    future.set_exception(OSError(errno.EPIPE, "the fork server exited"))
+                    break
+        self._pending.clear()
+
+class CommandEngine(metaclass=Singleton):
+
+    """
+    Runs commands (see opsmop.core.command) on asyncio event loops, one kept per thread, so
+    providers can run several probes at once through Provider.gather() and the async methods
+    of Provider.  No more than UserDefaults.max_commands() commands run at once on each loop.
+    The synchronous Provider.run() and Provider.test() wait on the same loop.
+
+    Processes are started with subprocess.Popen, or by a ForkServer if enabled, and their pipes
+    and exit are waited on through the loop.  asyncio's own subprocess support is not used, as before Python 3.12 it starts a
+    thread to wait on every process, which makes each command noticeably slower.
+    """
+
+    __slots__ = [ '_local', '_use_fork_server' ]
+
+    def __init__(self):
+        self._local = threading.local()
+        self._use_fork_server = None
+
+    def set_fork_server(self, enabled):
+        """
+        Overrides UserDefaults.fork_server(), for this process.
+        """
+        self._use_fork_server = enabled
+
+    def _fork_server(self, required=False):
+        if self._use_fork_server is None:
+            self._use_fork_server = UserDefaults.fork_server()
+        local = self._local
+        if not (self._use_fork_server or required) or getattr(local, 'loop', None) is not asyncio.get_running_loop():
+            return None
+        server = getattr(local, 'fork_server', None)
+        if server is None:
+            try:
+                server = ForkServer(local.loop)
+            except OSError:
+                # no AF_UNIX SOCK_SEQPACKET here, or no way to start the helper
+                server = False
+            local.fork_server = server
+        if not server or not server.alive():
+            return None
+        return server
+
+    async def spawn(self, command, shell=True, env=None, limits=None):
+        """
+        Starts a command, like subprocess.Popen with stdin and stdout (which stderr also goes to)
+        as pipes, in a new process group, and returns the process for use with write(), read(),
+        wait() and terminate().  Uses the fork server when it is enabled (see UserDefaults.fork_server())
+        and for every command with limits (see opsmop.core.limits), which the fork server applies.
+        The limits that were applied are in the limits attribute of the process, if it has one.
+        """
+        server = self._fork_server(required=bool(limits))
+        if server is not None:
+            try:
+                return await self._serve(server, command, shell, env, limits)
+            except OSError as e:
+                if server.alive() and e.errno != errno.EMSGSIZE:
+                    raise
+                # the helper went away, or the command and its environment are too large to
+                # send to it, so start the command here instead
+        if limits:
+            return self._popen_limited(command, shell, env, limits)
+        return subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=shell, env=env, **NEW_GROUP)
+
+    def _popen_limited(self, command, shell, env, limits):
+        """
+        Starts a command with limits without the fork server, when it cannot be used.  The nice and
+        IO priority limits are applied in the child before it runs the command, which reports the
+        ones that held back on a pipe.  Limits needing a cgroup are not applied.
+        """
+        if 'io_class' in limits or 'io_level' in limits:
+            fork_server.load_libc()
+        (report, report_w) = os.pipe()
+        def preexec():
+            applied = fork_server.apply_priority(limits, dict())
+            os.write(report_w, json.dumps(applied).encode('utf-8'))
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=shell, env=env, preexec_fn=preexec, **NEW_GROUP)
+        except BaseException:
+            os.close(report)
+            raise
+        finally:
+            os.close(report_w)
+        # the child has run the command by the time Popen returns, closing its end of the pipe
+        with open(report, 'rb') as fd:
+            data = fd.read()
+        process.limits = json.loads(data) if data else dict()
+        return process
+
+    def _loop(self):
+        loop = getattr(self._local, 'loop', None)
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            self._local.loop = loop
+            self._local.slots = None
+        return loop
+
+    def slots(self):
+        """
+        The semaphore a command holds while its process runs.  Must be called from a coroutine.
+        """
+        local = self._local
+        if getattr(local, 'loop', None) is not asyncio.get_running_loop():
+            # a loop this engine did not create, such as one the caller runs
+            return asyncio.Semaphore(UserDefaults.max_commands())
+        if local.slots is None:
+            local.slots = asyncio.Semaphore(UserDefaults.max_commands())
+        return local.slots
+
+    async def _ready(self, fd, write=False):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        def ready():
+            if not future.done():
+                future.set_result(None)
+        if write:
+            loop.add_writer(fd, ready)
+        else:
+            loop.add_reader(fd, ready)
+        try:
+            await future
+        finally:
+            if write:
+                loop.remove_writer(fd)
+            else:
+                loop.remove_reader(fd)
+
+    async def read(self, pipe):
+        """
+        Returns the next output available from a pipe, or b'' once it is closed.
+        """
+        fd = pipe.fileno()
+        os.set_blocking(fd, False)
+        while True:
+            try:
+                return os.read(fd, CHUNK_SIZE)
+            except BlockingIOError:
+                await self._ready(fd)
+
+    def write(self, pipe, data):
+        """
+        Writes data to a pipe and closes it, stopping early if the reader goes away.  Returns None
+        if that is already done, as it usually is for small inputs, otherwise a coroutine to await
+        for the rest.
+        """
+        fd = pipe.fileno()
+        os.set_blocking(fd, False)
+        view = memoryview(data)
+        try:
+            while view:
+                view = view[os.write(fd, view):]
+        except BlockingIOError:
+            return self._write_rest(pipe, view)
+        except (BrokenPipeError, ConnectionResetError):
+            # the command exited without reading all of its input
+            pass
+        pipe.close()
+        return None
+
+    async def _write_rest(self, pipe, view):
+        fd = pipe.fileno()
+        try:
+            while view:
+                try:
+                    view = view[os.write(fd, view):]
+                except BlockingIOError:
+                    await self._ready(fd, write=True)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            pipe.close()
+
+    async def _serve(self, server, command, shell, env, limits):
+        if env is None:
+            env = dict(os.environ)
+        argv = simple_argv(command) if shell else command
+        if argv is not None:
+            try:
+                return await server.spawn(argv, env, limits)
+            except FileNotFoundError:
+                if not shell:
+                    raise
+                # let the shell report the missing command, as it would have
+        return await server.spawn([ '/bin/sh', '-c', command ], env, limits)
+
+    async def wait(self, process):
+        """
+        Waits for a process from spawn() to exit and returns its return code.
+        """
+        if type(process) == ServedProcess:
+            if process.returncode is None:
+                # shielded, as the exit future is shared by everything waiting on the process
+                process.returncode = await asyncio.shield(process._exited)
+            return process.returncode
+        if process.poll() is None:
+            pidfd = None
+            if hasattr(os, 'pidfd_open'):
+                try:
+                    pidfd = os.pidfd_open(process.pid)
+                except OSError:
+                    pass
+            if pidfd is not None:
+                # readable once the process has exited (Linux)
+                try:
+                    await self._ready(pidfd)
+                finally:
+                    os.close(pidfd)
+            else:
+                await asyncio.get_running_loop().run_in_executor(None, process.wait)
+        return process.wait()
+
+    async def terminate(self, process, grace=TIMEOUT_GRACE):
+        """
+        Stops a process from spawn() and everything else in its process group, with SIGTERM and
+        then SIGKILL for whatever is left once the process exits or grace seconds have passed.
+        """
+        self._signal_group(process, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.wait(process), grace)
+        except asyncio.TimeoutError:
+            pass
+        self._signal_group(process, signal.SIGKILL)
+
+    def _signal_group(self, process, signum):
+        try:
+            os.killpg(process.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            # already gone, or (as with sudo) a group we may not signal
+            pass
+
+    def run(self, awaitable):
+        """
+        Waits for a coroutine from synchronous code and returns what it returns.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._loop().run_until_complete(awaitable)
+        # called from a coroutine already running on this thread, which cannot be waited on
+        # here, so finish it on a thread of its own
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(self.run, awaitable).result()
+
+    def gather(self, awaitables):
+        """
+        Runs coroutines at the same time and returns their results, in order.
+        """
+        async def gather():
+            return await asyncio.gather(*awaitables)
+        return self.run(gather())
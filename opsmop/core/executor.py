@@ -15,30 +15,32 @@
 import time
 
 from opsmop.callbacks.callbacks import Callbacks
-from opsmop.callbacks.common import CommonCallbacks
-from opsmop.callbacks.event_stream import EventStreamCallbacks
-from opsmop.callbacks.replay import ReplayCallbacks
 from opsmop.client.user_defaults import UserDefaults
 from opsmop.core.collection import Collection
+from opsmop.core.compiler import Compiler
+from opsmop.core.conditions import ConditionCache
 from opsmop.core.context import APPLY, CHECK, VALIDATE, Context
-from opsmop.core.errors import OpsMopStop
+from opsmop.core.errors import NoSuchProviderError, OpsMopStop
+from opsmop.core.limits import Limits
+from opsmop.core.plan_cache import PlanCache
 from opsmop.core.result import Result
 from opsmop.core.role import Role
 from opsmop.core.roles import Roles
+from opsmop.core.tracer import Tracer
+from opsmop.core.validation_cache import ValidationCache
 from opsmop.inventory.host import Host
 from opsmop.lookups.lookup import Lookup
-from opsmop.push.batch import Batch
-from opsmop.push.connections import ConnectionManager
+from opsmop.types.type import Type
 
 # ---------------------------------------------------------------
 
 class Executor(object):
 
-    __slots__ = [ '_policies', '_tags', '_push', '_local_host', 'connection_manager', '_limit_groups', '_limit_hosts' ]
+    __slots__ = [ '_policies', '_tags', '_push', '_local_host', 'connection_manager', '_limit_groups', '_limit_hosts', '_programs', '_prevalidated' ]
 
     # ---------------------------------------------------------------
 
-    def __init__(self, policies, local_host=None, tags=None, push=False, extra_vars=None, limit_groups=None, limit_hosts=None, relative_root=None):
+    def __init__(self, policies, local_host=None, tags=None, push=False, extra_vars=None, limit_groups=None, limit_hosts=None, relative_root=None, programs=None, prevalidated=False):
 
         """
         The Executor runs a list of policies in either CHECK, APPLY, or VALIDATE modes
@@ -48,11 +50,19 @@ class Executor(object):
         self._policies = policies
         self._tags = tags
         self._push = push
+        # CompiledRoles by role, see opsmop.core.compiler.  Push mode hosts receive these precompiled.
+        if programs is None:
+            programs = dict()
+        self._programs = programs
+        # push mode hosts run roles the controller has already validated
+        self._prevalidated = prevalidated
         self._limit_groups = limit_groups
         self._limit_hosts = limit_hosts
         if local_host is None:
             local_host = Host("127.0.0.1")
         self._local_host = local_host
+        # spans are recorded for the host doing the work, see opsmop.core.tracer
+        Tracer().set_host('controller' if push else local_host.name)
         Context().set_extra_vars(extra_vars)
         Context().set_relative_root(relative_root)
         self.connection_manager = None
@@ -93,6 +103,8 @@ class Executor(object):
         Context().set_mode(mode)
         for policy in self._policies:     
             if self._push:
+                # push mode modules (and mitogen) are only imported when used, to keep local runs starting quickly
+                from opsmop.push.connections import ConnectionManager
                 self.connection_manager = ConnectionManager(policy, self._tags, limit_groups=self._limit_groups, limit_hosts=self._limit_hosts)
             self.run_policy(policy=policy)
 
@@ -106,32 +118,58 @@ class Executor(object):
         # assign a new top scope to the policy object.
         policy.init_scope()
         roles = policy.get_roles()
-        for role in roles.items:
-            Context().set_role(role)
-            if not self._push:
-                self.process_local_role(policy, role)
-            else:
-                self.process_remote_role(policy, role)
+        with Tracer().span(policy.__class__.__name__, 'policy'):
+            try:
+                for role in roles.items:
+                    Context().set_role(role)
+                    with Tracer().span(role.__class__.__name__, 'role'):
+                        if not self._push:
+                            self.process_local_role(policy, role)
+                        else:
+                            self.process_remote_role(policy, role)
+            finally:
+                # everything recorded as converged so far is still true if we stopped early
+                PlanCache().save()
         Callbacks().on_complete(policy)
 
     # ---------------------------------------------------------------
 
-    def validate_role(self, role):
+    def compiled_role(self, policy, role):
         """
-        Validates inputs for one role
+        Returns the flattened resource and handler Programs for a role, compiling them once.
         """
+        compiled = self._programs.get(role, None)
+        if compiled is None:
+            compiled = Compiler(tags=self._tags).compile_role(policy, role)
+            self._programs[role] = compiled
+        return compiled
+
+    # ---------------------------------------------------------------
+
+    def validate_role(self, policy, role, compiled):
+        """
+        Validates inputs for one role.  Validation does not depend on the host, so every
+        resource is checked whatever its conditions, and in push mode this happens once
+        on the controller rather than on every host.
+        """
+
+        cache = ValidationCache()
+        digest = cache.digest(policy, role, compiled)
+        if cache.is_valid(policy, role, digest):
+            return
 
-        def validate(resource):
-            return resource.validate
-        
-        # resources and handlers must be processed seperately
         # the validate method will raise exceptions when problems are found
         original_mode = Context().mode()
         Context().set_mode(VALIDATE)
-        role.walk_children(items=role.get_children('resources'), which='resources', fn=validate, tags=self._tags)
-        role.walk_children(items=role.get_children('handlers'), which='handlers', fn=validate)
+        Limits.check(policy)
+        Limits.check(role)
+        for program in (compiled.resources, compiled.handlers):
+            for step in program.steps:
+                Limits.check(step.resource)
+                step.resource.validate()
         if original_mode:
             Context().set_mode(original_mode)
+        cache.record(policy, role, digest)
 
     # ---------------------------------------------------------------
 
@@ -146,24 +184,30 @@ class Executor(object):
     # ---------------------------------------------------------------
 
     def connect_to_all_hosts(self, hosts, role, max_workers):
+        from opsmop.push.batch import Batch
         batch = Batch(hosts, batch_size=200)
         def host_connector(host):
             Context().set_host(host)
-            self.connection_manager.connect(host, role)
+            with Tracer().span('connect', 'connect', host=host.name):
+                self.connection_manager.connect(host, role)
         batch.apply_async(host_connector, max_workers=max_workers)
 
     # ---------------------------------------------------------------
 
     def run_roles_on_all_hosts(self, hosts, policy, role, batch_size):
+        # compile once here rather than once on every host
+        compiled = self.compiled_role(policy, role)
         def role_runner(host):
             mode = Context().mode()
-            self.connection_manager.remotify_role(host, policy, role, mode)
+            self.connection_manager.remotify_role(host, policy, role, compiled, mode)
+        from opsmop.push.batch import Batch
         batch = Batch(hosts, batch_size=batch_size)
         batch.apply(role_runner)
 
     # ---------------------------------------------------------------
 
     def process_summary(self, hosts):
+        from opsmop.callbacks.replay import ReplayCallbacks
         failures = Context().host_failures()
         failed_hosts = [ f for f in failures.keys() ]
         changed_hosts = [ h for h in hosts if h.actions() ]
@@ -185,6 +229,8 @@ class Executor(object):
         import dill
 
         self.connection_manager.announce_role(role)
+        # validate here once, the hosts are told not to
+        self.validate_role(policy, role, self.compiled_role(policy, role))
         hosts = role.inventory().hosts()
         self.connection_manager.add_hosts(hosts)
 
@@ -203,6 +249,7 @@ class Executor(object):
     def process_local_role(self, policy=None, role=None):
 
         host = self._local_host
+        compiled = self.compiled_role(policy, role)
 
         Context().set_host(host)
 
@@ -211,29 +258,31 @@ class Executor(object):
         policy.attach_child_scope_for(role)
         # tell the callbacks we are in validate mode - this may alter or quiet their output
         Callbacks().on_validate()
-        # always validate the role in every mode (VALIDATE, CHECK ,or APPLY)
-        self.validate_role(role)
+        # always validate the role in every mode (VALIDATE, CHECK ,or APPLY), unless the controller did
+        if not self._prevalidated:
+            self.validate_role(policy, role, compiled)
         # skip the role if we need to
         if not role.conditions_true():
             Callbacks().on_skipped(role)
             return
         # process the tree for real for non-validate modes
         if not Context().is_validate():
-            self.execute_role_resources(host, role)
-            self.execute_role_handlers(host, role)
+            self.execute_role_resources(host, role, compiled)
+            self.execute_role_handlers(host, role, compiled)
         # run any user hooks
         role.post()
 
 
     # ---------------------------------------------------------------
 
-    def execute_role_resources(self, host, role):
+    def execute_role_resources(self, host, role, compiled):
         """ 
         Processes non-handler resources for one role for CHECK or APPLY mode
         """
         # tell the context we are processing resources now, which may change their behavior
         # of certain methods like on_resource()
         Callbacks().on_begin_role(role)
+        self.prefetch(compiled)
         def execute_resource(resource):
             # execute each resource through plan() and if needed apply() stages, but before and after
             # doing so, run any user pre() or post() hooks implemented on that object.
@@ -241,37 +290,88 @@ class Executor(object):
             result = self.execute_resource(host=host, resource=resource)
             resource.post()
             return result
-        role.walk_children(items=role.get_children('resources'), which='resources', fn=execute_resource, tags=self._tags)
+        program = compiled.resources
+        workers = role.parallel()
+        if workers <= 1:
+            for batch in program.batches(role, tags=self._tags):
+                if len(batch) > 1:
+                    self.execute_batch(host, [ step.resource for step in batch ])
+                else:
+                    execute_resource(batch[0].resource)
+            return
+        # opt-in: independent resources run on a pool of workers, ordering comes from 'requires'
+        # and from barriers (see opsmop.core.scheduler).  All resources finish before handlers start.
+        from opsmop.core.scheduler import Scheduler
+        scheduler = Scheduler(program, workers)
+        try:
+            for step in program.run(role, tags=self._tags):
+                scheduler.submit(step.resource, execute_resource)
+            scheduler.wait()
+        finally:
+            scheduler.shutdown()
+
+    # ---------------------------------------------------------------
+
+    def prefetch(self, compiled):
+        """
+        Hands each provider class the resources of a role that will use it, see Provider.prefetch.
+        """
+        found = dict()
+        for program in (compiled.resources, compiled.handlers):
+            for step in program.steps:
+                resource = step.resource
+                if not (step.leaf and issubclass(type(resource), Type)):
+                    continue
+                try:
+                    cls = resource.provider_class()
+                except NoSuchProviderError:
+                    # reported if the resource runs
+                    continue
+                if cls is not None:
+                    found.setdefault(cls, []).append(resource)
+        for (cls, resources) in found.items():
+            cls.prefetch(resources)
 
     # ---------------------------------------------------------------
 
-    def execute_role_handlers(self, host, role):
+    def execute_role_handlers(self, host, role, compiled):
         """
         Processes handler resources for one role for CHECK or APPLY mode
         """
         # see comments for prior method for details
         Callbacks().on_begin_handlers()
-        def execute_handler(handler):
+        def execute_handler(step):
+            handler = step.resource
             handler.pre()
-            result = self.execute_resource(host=host, resource=handler, handlers=True)
+            result = self.execute_resource(host=host, resource=handler, handlers=True, handles=step.handles)
             handler.post()
             return result
-        role.walk_children(items=role.get_children('handlers'), which='handlers', fn=execute_handler, tags=self._tags)
+        for step in compiled.handlers.run(role, tags=self._tags, handlers=True):
+            execute_handler(step)
 
     # ---------------------------------------------------------------
 
-    def do_plan(self, resource):
+    def do_plan(self, resource, provider=None):
         """
         Ask a resource for the provider, and then see what the planned actions should be.
         The planned actions are kept on the provider object. We don't need to obtain the plan.
         Return the provider.
         """
         # ask the resource for a provider instance
-        provider = resource.provider()
+        if provider is None:
+            provider = resource.provider()
 
         if provider.skip_plan_stage():
             return provider
-        
+
+        # if the resource was converged the last time we saw these exact inputs, there is
+        # nothing to plan.  The fingerprint is None if the provider does not support this.
+        digest = PlanCache().fingerprint(provider)
+        if PlanCache().is_converged(provider, digest):
+            Callbacks().on_plan_cached(provider)
+            provider.commit_to_plan()
+            return provider
+
         # tell the context object we are about to run the plan stage.
         Callbacks().on_plan(provider)
         # compute the plan
@@ -280,15 +380,19 @@ class Executor(object):
         # on the provider
         provider.commit_to_plan()
 
+        if not provider.has_planned_actions():
+            PlanCache().record(provider, digest)
+
         return provider
 
     # ---------------------------------------------------------------
 
-    def do_apply(self, host, provider, handlers):
+    def do_apply(self, host, provider, handlers, result=None):
         """
         Once a provider has a plan generated, see if we need to run the plan.
         If so, also run any actions associated witht he apply step, which mostly means registering
         variables from apply results.
+        result - if the actions were already taken by apply_batch(), the Result it gave the provider
         """
 
         # some simple providers - like Echo, do not have a planning step
@@ -300,7 +404,12 @@ class Executor(object):
         # indicate we are about take some actions
         Callbacks().on_apply(provider)
         # take them
-        result = provider.apply()
+        if result is None:
+            result = provider.apply()
+        if provider.actions_taken:
+            # the host may now answer fact lookups differently, and cached host state may be out of date
+            ConditionCache().invalidate_facts()
+            Context().host_state_changed()
         if not handlers:
             # let the callbacks now we have taken some actions
             Callbacks().on_taken_actions(provider, provider.actions_taken)
@@ -327,6 +436,12 @@ class Executor(object):
             fatal = True
         result.fatal = fatal
         result.changed = provider.has_changed()
+
+        # the applied resource is converged now, but what we manage has changed on disk
+        if fatal:
+            PlanCache().forget(provider)
+        else:
+            PlanCache().record(provider, PlanCache().fingerprint(provider))
         # TODO: eliminate the actions class
         if result.changed:
             result.actions = [ x.do for x in provider.actions_taken ]
@@ -368,10 +483,11 @@ class Executor(object):
 
     # ---------------------------------------------------------------
 
-    def execute_resource(self, host, resource, handlers=False):
+    def execute_resource(self, host, resource, handlers=False, handles=None):
         """
         This handles the plan/apply intercharge for a given resource in the resource tree.
-        It is called recursively via walk_children to run against all resources.
+        It is called for each step of a compiled Program, see opsmop.core.compiler.
+        handles - for handlers, the precompiled handler names of the resource
         """
         assert host is not None
 
@@ -380,7 +496,9 @@ class Executor(object):
             return
 
         # if in handler mode we do not process the handler unless it was signaled
-        if handlers and not Context().has_seen_any_signal(host, resource.all_handles()):
+        if handles is None:
+            handles = resource.all_handles()
+        if handlers and not Context().has_seen_any_signal(host, handles):
             Callbacks().on_skipped(resource, is_handler=handlers)
             return
 
@@ -390,12 +508,64 @@ class Executor(object):
 
         # plan always, apply() only if not in check mode, else assume
         # the plan was executed.
-        provider = self.do_plan(resource)
-        assert provider is not None
-        if Context().is_apply():
-            self.do_apply(host, provider, handlers)
-        else: # is_check
-            self.do_simulate(host, provider)
+        with Tracer().span(resource, 'resource'):
+            with Tracer().span('plan', 'plan'):
+                provider = self.do_plan(resource)
+            assert provider is not None
+            if Context().is_apply():
+                with Tracer().span('apply', 'apply'):
+                    self.do_apply(host, provider, handlers)
+            else: # is_check
+                self.do_simulate(host, provider)
 
         # if anything has changed, let the callbacks know about it
         self.signal_changes(host=host, provider=provider, resource=resource)
+
+    # ---------------------------------------------------------------
+
+    def execute_batch(self, host, resources):
+        """
+        Processes resources that Program.batches() grouped together, such as several packages
+        in a row.  Their provider class looks up what to plan for all of them at once and takes
+        the planned actions with as few commands as it can, but every resource still gets its
+        own callbacks, result, registration and signals.
+        """
+        for resource in resources:
+            resource.pre()
+        providers = [ resource.provider() for resource in resources ]
+
+        # the batch key normally means one provider class, but types may pick providers as they like
+        groups = []
+        for provider in providers:
+            if groups and type(groups[-1][-1]) == type(provider):
+                groups[-1].append(provider)
+            else:
+                groups.append([ provider ])
+
+        for group in groups:
+            for provider in group:
+                Callbacks().on_resource(provider.resource, False)
+                with Tracer().span(provider.resource, 'resource'):
+                    with Tracer().span('plan', 'plan'):
+                        if provider is group[0]:
+                            type(provider).plan_batch(group)
+                        self.do_plan(provider.resource, provider=provider)
+                if not Context().is_apply():
+                    self.do_simulate(host, provider)
+                    self.signal_changes(host=host, provider=provider, resource=provider.resource)
+                    provider.resource.post()
+        if not Context().is_apply():
+            return
+
+        results = dict()
+        for group in groups:
+            pending = [ provider for provider in group if provider.has_planned_actions() ]
+            if len(pending) > 1:
+                Callbacks().on_batch(pending)
+                with Tracer().span('apply batch', 'apply'):
+                    results.update(type(pending[0]).apply_batch(pending))
+        for (resource, provider) in zip(resources, providers):
+            with Tracer().span('apply', 'apply'):
+                self.do_apply(host, provider, False, result=results.get(provider, None))
+            self.signal_changes(host=host, provider=provider, resource=resource)
+            resource.post()
@@ -12,8 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
+from opsmop.core.resource import Resource
 from opsmop.lookups.lookup import Lookup
 
+# defaults of these types can be shared between resources rather than copied
+IMMUTABLE = (type(None), bool, int, float, str, frozenset)
+
 # TODO: refactor
 
 class Field(object):
@@ -27,9 +33,11 @@ class Field(object):
     """
     
     # prevent accidental typos of field arguments that don't exist when working on resource type code
-    __slots__ = [ 'kwargs', 'kind', 'of', 'default', 'empty', 
+    PARAMETERS = [ 'kwargs', 'kind', 'of', 'default', 'empty', 
         'loader', 'validator', 'allow_none', 'internal', 'help', 'lazy']
 
+    __slots__ = PARAMETERS + [ '_has_default', '_loader_name' ]
+
     def __init__(self, **kwargs):
 
         """
@@ -40,7 +48,7 @@ class Field(object):
         self.kwargs = kwargs
 
         for (k,v) in kwargs.items():
-            if k not in self.__slots__:
+            if k not in self.PARAMETERS:
                 raise Exception("unknown Field parameter: %s" % k)
 
         # kind is the type of the field, this should be a valid Python type
@@ -61,6 +69,35 @@ class Field(object):
         self.help = kwargs.get('help', '')
         # if set, do not resolve the field immediately, it will be evaluated further down at runtime
         self.lazy = kwargs.get('lazy', False)
+        self._has_default = 'default' in kwargs
+        # set by compile() when the loader is a method of the resource
+        self._loader_name = None
+
+    def compile(self, resource):
+        """
+        Called once per resource class, see Fields.for_resource.  A loader like loader=self.set_variables
+        is bound to the first resource of the class, so it is kept by name and looked up on each resource.
+        """
+        loader = self.loader
+        if loader is not None and getattr(loader, '__self__', None) is resource:
+            self._loader_name = loader.__name__
+            # do not keep the first resource alive, or send it along whenever a resource is pickled
+            self.loader = None
+            del self.kwargs['loader']
+
+    def shared_default(self, obj, k):
+        """
+        True if every resource missing this field can just be given the default, without coercion
+        or checks.  The default is checked here, once, against the first resource of the class.
+        """
+        if not self._has_default or self.validator or type(self.default) not in IMMUTABLE:
+            return False
+        try:
+            self.check(obj, k, self.default)
+        except Exception:
+            # leave it to load() to raise the error for each resource, as it always has
+            return False
+        return True
 
     def has_field(self, k):
         """
@@ -74,16 +111,18 @@ class Field(object):
         Various levels of defaults are supported. This is where we set defaults.
         """
 
-        from opsmop.core.resource import Resource
-
         if k in obj.kwargs:
             # if available, get the value of the key from the object
             v  = obj.kwargs[k]
         else:
             # the field wasn't set on the object
-            if self.has_field('default'):
-                # if we have a default, use it
+            if self._has_default:
+                # if we have a default, use it (the spec is shared by all resources of a class, so do not share a list or dict)
                 v = self.default
+                if type(v) not in IMMUTABLE:
+                    v = copy.copy(v)
+            elif self._loader_name:
+                v = getattr(obj, self._loader_name)()
             elif self.loader:
                 # if we have a default function that returns a value, use it instead
                 v = self.loader()
@@ -174,6 +213,19 @@ class Field(object):
 
         # compute the actual value, subbing in a default if required, coercing the value if required, etc
         v = self._get_coerced_resource_value(obj, k)
+        self.check(obj, k, v)
+
+        # all checks cleared (whew) - save the field to the object
+        try:
+            setattr(obj,k,v)
+        except:
+            print("failed to set: %s=%s on %s" % (k, v, type(obj)))
+            raise
+
+    def check(self, obj, k, v):
+        """
+        Raises an exception if v is not an acceptable value for the field.
+        """
 
         # if none is disallowed, make sure the value isn't None
         if (not self.allow_none) and (v is None):
@@ -186,10 +238,3 @@ class Field(object):
         # if a validator function is attached, run it.  It should raise an exception if there are validation problems
         if self.validator:
             self.validator(v)
-
-        # all checks cleared (whew) - save the field to the object
-        try:
-            setattr(obj,k,v)
-        except:
-            print("failed to set: %s=%s on %s" % (k, v, type(obj)))
-            raise
@@ -12,7 +12,35 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-COMMON_FIELDS = [ 'when', 'signals', 'handles', 'method', 'register', 'ignore_errors', 'tags' ]
+COMMON_FIELDS = [ 'when', 'signals', 'handles', 'method', 'register', 'ignore_errors', 'tags', 'requires', 'limits' ]
+
+# placeholder for a field value that has not been loaded yet
+_UNSET = object()
+
+class FieldValue(object):
+
+    """
+    Gets and sets one field of a resource.  The values of all fields live in one list on the
+    resource (resource._values) in the order of the field spec, rather than as separate attributes.
+    Fields.compile adds one of these to the resource class for each field.
+    """
+
+    __slots__ = [ 'name', 'index' ]
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj._values[self.index]
+        if value is _UNSET:
+            raise AttributeError(self.name)
+        return value
+
+    def __set__(self, obj, value):
+        obj._values[self.index] = value
 
 # TODO: refactor
 
@@ -28,6 +56,9 @@ class Fields(object):
 
     __slots = [ 'fields' ]
 
+    # compiled specs by resource class, see for_resource
+    _compiled = dict()
+
     def __init__(self, resource, **fields):
 
         """
@@ -48,11 +79,56 @@ class Fields(object):
         register - saves the result to a variable, regardless of type
 
         ignore_errors - if the return is a fatal result object, ignore it anyway
+
+        requires - resources that must finish before this one, used when a role runs resources in parallel
         """
 
         self.fields = fields
-        for (k,v) in self.common_field_spec(resource).items():
+        common = self.common_field_spec(resource)
+        for (k,v) in common.items():
             self.fields[k] = v
+        # names of the fields every resource has, as opposed to those defined by the type
+        self.common_names = set(common.keys())
+        self.names = frozenset(self.fields.keys())
+        # values for fields that resources do not set, filled in by compile()
+        self.defaults = dict()
+        # position of each field in resource._values
+        self.index = { k: i for (i, k) in enumerate(self.fields.keys()) }
+        # what resource._values starts as, before parameters are loaded
+        self.initial = None
+
+    @classmethod
+    def for_resource(cls, resource):
+        """
+        Returns the field spec for the class of the resource.  The spec only depends on the class,
+        so it is built and compiled when the first resource of a class is constructed and shared
+        by every later one, which then only has to load the parameters it was given.
+        """
+        klass = type(resource)
+        spec = cls._compiled.get(klass, None)
+        if spec is None:
+            spec = resource.fields()
+            spec.compile(resource)
+        return spec
+
+    def compile(self, resource):
+        """
+        Prepares a spec made by resource.fields() to be shared by all resources of the same class.
+        """
+        for (k, field) in self.fields.items():
+            field.compile(resource)
+        self.defaults = { k: field.default for (k, field) in self.fields.items() if field.shared_default(resource, k) }
+        self.initial = [ self.defaults.get(k, _UNSET) for k in self.fields.keys() ]
+        self.install(type(resource))
+
+    def install(self, klass):
+        """
+        Makes this the spec for a resource class, adding the attributes that read and write its fields.
+        Resources unpickled in another process (see opsmop.push) can be the first of their class there.
+        """
+        for (k, index) in self.index.items():
+            setattr(klass, k, FieldValue(k, index))
+        Fields._compiled[klass] = self
 
     def common_field_spec(self, resource):
 
@@ -72,7 +148,9 @@ class Fields(object):
             extra_variables = Field(kind=dict, empty=True, help=None),
             tags            = Field(kind=list, of=str, default=None, help="allows applying part of the policy"),
             failed_when     = Field(default=None, lazy=True, help="if set, specify terms of resource application failure"),
-            changed_when    = Field(default=None, lazy=True, help="if set, only signal handlers if this is true")
+            changed_when    = Field(default=None, lazy=True, help="if set, only signal handlers if this is true"),
+            requires        = Field(kind=list, of=Resource, default=None, help="resources that must finish first when the role runs in parallel"),
+            limits          = Field(kind=dict, default=None, help="priority and resource limits for the commands run, see opsmop.core.limits")
 
         )
 
@@ -82,6 +160,8 @@ class Fields(object):
         Called by Resource code to verify no fields were passed in that were not in the field specification.
         """
 
+        if self.names.issuperset(obj.kwargs):
+            return
         for (k,v) in obj.kwargs.items():
             if k.startswith("!"):
                 continue
@@ -98,5 +178,11 @@ class Fields(object):
         for an example of a field specification.
         """
 
+        kwargs = obj.kwargs
+        defaults = self.defaults
+        # fields that were not given and have a plain default need no checks, see Field.shared_default
+        obj._values = self.initial.copy()
         for (k,field) in self.fields.items():
+            if k in defaults and k not in kwargs:
+                continue
             field.load(obj, k)
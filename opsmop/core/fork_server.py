@@ -0,0 +1,276 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+The helper process behind opsmop.core.engine.ForkServer.  Its source is run in a fresh interpreter
+(python -I -S -c SOURCE FD) and imports nothing from opsmop.  It is what applies command limits
+(see opsmop.core.limits) and is otherwise off by default, as subprocess already avoids copying a
+large process where it can and the --probes benchmark does not show the helper being faster.
+
+Requests arrive as JSON over the socket FD, one per datagram, each carrying the stdin and stdout
+pipes of the command to start, which runs in a new process group:
+
+    { "id": 1, "argv": [ ... ], "env": { ... }, "cwd": "/" }
+
+A request may also give limits (see opsmop.core.limits) and the cgroup_root to make cgroups in.
+The helper then forks, applies the limits in the child and has it exec the command, so they hold
+from the start for everything the command runs.  It answers with, first, one of
+
+    { "id": 1, "pid": 1234, "limits": { the limits that could be applied } }
+    { "id": 1, "errno": 2, "error": "message" }
+
+then, once a started command exits, its return code as subprocess would report it:
+
+    { "id": 1, "rc": 0 }
+
+The helper exits when the socket is closed.
+"""
+
+import errno
+import json
+import os
+import select
+import signal
+import socket
+import sys
+
+# the largest request accepted, which includes the environment of the command
+MAX_REQUEST = 1024 * 1024
+
+RESTORE_SIGNALS = [ getattr(signal, name) for name in [ 'SIGPIPE', 'SIGXFSZ' ] if hasattr(signal, name) ]
+
+# ioprio_set(2) has no wrapper in Python, so it is called by syscall number
+IOPRIO_SET = { 'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314, 'ppc64le': 273, 's390x': 282 }
+IO_CLASSES = { 'realtime': 1, 'best-effort': 2, 'idle': 3 }
+IO_LEVEL = 4
+
+# the period cpu_max is a share of, in microseconds
+CPU_PERIOD = 100000
+
+_libc = None
+
+def _returncode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def _send(sock, **message):
+    sock.send(json.dumps(message).encode('utf-8'))
+
+def _spawn(request, fds):
+    (stdin, stdout) = fds
+    actions = [
+        (os.POSIX_SPAWN_DUP2, stdin, 0),
+        (os.POSIX_SPAWN_DUP2, stdout, 1),
+        (os.POSIX_SPAWN_DUP2, stdout, 2)
+    ]
+    os.chdir(request['cwd'])
+    argv = request['argv']
+    # as with subprocess, commands start with the signals Python ignores back at their defaults
+    return os.posix_spawnp(argv[0], argv, request['env'], file_actions=actions, setpgroup=0, setsigdef=RESTORE_SIGNALS)
+
+def _write(path, value):
+    with open(path, 'w') as fd:
+        fd.write(value)
+
+def _make_cgroup(request):
+    """
+    Makes a cgroup for a command with memory_max or cpu_max, returning its path and the limits set
+    in it, or (None, {}) where there is no cgroup v2 hierarchy to use.
+    """
+    limits = request['limits']
+    caps = dict()
+    if 'memory_max' in limits:
+        caps['memory_max'] = ('memory.max', str(limits['memory_max']))
+    if 'cpu_max' in limits:
+        caps['cpu_max'] = ('cpu.max', "%d %d" % (limits['cpu_max'] * CPU_PERIOD / 100, CPU_PERIOD))
+    if not caps:
+        return (None, dict())
+    root = request['cgroup_root']
+    if not os.path.exists(os.path.join(os.path.dirname(root), 'cgroup.controllers')):
+        return (None, dict())
+    try:
+        os.makedirs(root, exist_ok=True)
+        for controller in [ 'memory', 'cpu' ]:
+            try:
+                _write(os.path.join(root, 'cgroup.subtree_control'), "+%s" % controller)
+            except OSError:
+                pass
+        path = os.path.join(root, "command-%d-%d" % (os.getpid(), request['id']))
+        os.mkdir(path)
+    except OSError:
+        return (None, dict())
+    applied = dict()
+    for (k, (name, value)) in caps.items():
+        try:
+            _write(os.path.join(path, name), value)
+            applied[k] = request['limits'][k]
+        except OSError:
+            pass
+    return (path, applied)
+
+def load_libc():
+    """
+    Loads what setting IO priorities needs.  Called before forking, so the child does not import.
+    """
+    global _libc
+    if _libc is None:
+        import ctypes
+        _libc = ctypes.CDLL(None, use_errno=True)
+
+def apply_priority(limits, applied):
+    """
+    Applies the nice, io_class and io_level limits to this process, adding those that held to
+    applied.  Used in forked children, here and by the engine when the fork server is not used.
+    """
+    if 'nice' in limits:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, limits['nice'])
+            applied['nice'] = limits['nice']
+        except OSError:
+            pass
+    if 'io_class' in limits or 'io_level' in limits:
+        io_class = limits.get('io_class', 'best-effort')
+        level = 0 if io_class == 'idle' else limits.get('io_level', IO_LEVEL)
+        try:
+            _ioprio_set(io_class, level)
+            applied['io_class'] = io_class
+            if io_class != 'idle':
+                applied['io_level'] = level
+        except OSError:
+            pass
+    return applied
+
+def _ioprio_set(io_class, level):
+    number = IOPRIO_SET.get(os.uname().machine, None)
+    if _libc is None or number is None:
+        raise OSError(errno.ENOSYS, "ioprio_set is not available")
+    # IOPRIO_WHO_PROCESS, this process
+    if _libc.syscall(number, 1, 0, (IO_CLASSES[io_class] << 13) | level) != 0:
+        import ctypes
+        raise OSError(ctypes.get_errno(), "ioprio_set failed")
+
+def _exec_limited(request, fds, cgroup, applied, report):
+    """
+    Runs in the child forked by _spawn_limited: applies the limits, reports the ones that held on
+    the report pipe, then becomes the command.  Never returns.
+    """
+    try:
+        limits = request['limits']
+        os.setpgid(0, 0)
+        if cgroup:
+            try:
+                _write(os.path.join(cgroup, 'cgroup.procs'), "0")
+                applied['cgroup'] = cgroup
+            except OSError:
+                applied = dict()
+        apply_priority(limits, applied)
+        (stdin, stdout) = fds
+        os.dup2(stdin, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stdout, 2)
+        signal.set_wakeup_fd(-1)
+        for signum in RESTORE_SIGNALS + [ signal.SIGCHLD ]:
+            signal.signal(signum, signal.SIG_DFL)
+        os.chdir(request['cwd'])
+        os.write(report, json.dumps(applied).encode('utf-8') + b"\n")
+        argv = request['argv']
+        os.execvpe(argv[0], argv, request['env'])
+    except OSError as e:
+        os.write(report, json.dumps(dict(errno=e.errno, error=e.strerror or str(e))).encode('utf-8') + b"\n")
+    finally:
+        os._exit(127)
+
+def _spawn_limited(request, fds):
+    """
+    Like _spawn, for a request with limits.  Returns the pid, the limits applied and the cgroup made.
+    """
+    if 'io_class' in request['limits'] or 'io_level' in request['limits']:
+        load_libc()
+    (cgroup, applied) = _make_cgroup(request)
+    (report, report_w) = os.pipe()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            os.close(report)
+            _exec_limited(request, fds, cgroup, applied, report_w)
+        os.close(report_w)
+        replies = b""
+        while True:
+            data = os.read(report, 4096)
+            if not data:
+                break
+            replies = replies + data
+    finally:
+        os.close(report)
+    replies = [ json.loads(line) for line in replies.splitlines() ]
+    if len(replies) > 1 or (replies and 'errno' in replies[0]):
+        os.waitpid(pid, 0)
+        _remove_cgroup(cgroup)
+        failure = replies[-1]
+        raise OSError(failure['errno'], failure['error'])
+    return (pid, replies[0] if replies else dict(), cgroup)
+
+def _remove_cgroup(cgroup):
+    if cgroup:
+        try:
+            os.rmdir(cgroup)
+        except OSError:
+            # something the command started is still in it
+            pass
+
+def serve(sock):
+    os.set_inheritable(sock.fileno(), False)
+    (wakeup, wakeup_w) = os.pipe()
+    os.set_blocking(wakeup, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    children = dict()
+    while True:
+        (readable, _, _) = select.select([ sock, wakeup ], [], [])
+        if wakeup in readable:
+            try:
+                while os.read(wakeup, 512):
+                    pass
+            except BlockingIOError:
+                pass
+            while children:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                (ident, cgroup) = children.pop(pid)
+                _remove_cgroup(cgroup)
+                _send(sock, id=ident, rc=_returncode(status))
+        if sock in readable:
+            (data, fds, _, _) = socket.recv_fds(sock, MAX_REQUEST, 2)
+            if not data:
+                return
+            for fd in fds:
+                os.set_inheritable(fd, False)
+            request = json.loads(data)
+            try:
+                if request.get('limits', None):
+                    (pid, applied, cgroup) = _spawn_limited(request, fds)
+                else:
+                    (pid, applied, cgroup) = (_spawn(request, fds), None, None)
+                children[pid] = (request['id'], cgroup)
+                _send(sock, id=request['id'], pid=pid, limits=applied)
+            except OSError as e:
+                _send(sock, id=request['id'], errno=e.errno, error=e.strerror or str(e))
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+if __name__ == '__main__':
+    serve(socket.socket(fileno=int(sys.argv[1])))
@@ -20,6 +20,8 @@ from opsmop.core.resources import Resources
 
 class Handlers(Resources):
 
+    __slots__ = []
+
     def __init__(self, **kwargs):
         handlers = []
         for (k,v) in kwargs.items():
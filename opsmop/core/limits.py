@@ -0,0 +1,93 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import re
+
+from opsmop.client.user_defaults import UserDefaults
+from opsmop.core.errors import ValidationError
+
+IO_CLASSES = [ 'realtime', 'best-effort', 'idle' ]
+MEMORY_SIZE = re.compile(r'^([0-9]+[KMGT]?|max)$')
+
+# each limit, with a test for its value and what the test expects
+CHECKS = dict(
+    nice       = (lambda v: type(v) == int and -20 <= v <= 19, "an integer from -20 to 19"),
+    io_class   = (lambda v: v in IO_CLASSES, "one of %s" % ", ".join(IO_CLASSES)),
+    io_level   = (lambda v: type(v) == int and 0 <= v <= 7, "an integer from 0 to 7"),
+    memory_max = (lambda v: (type(v) == int and v > 0) or (type(v) == str and MEMORY_SIZE.match(v) is not None), "a number of bytes or a size such as '512M'"),
+    cpu_max    = (lambda v: type(v) in (int, float) and v > 0, "a percentage of one CPU")
+)
+
+class Limits(object):
+
+    """
+    Limits on the priority and resources of the commands providers run, so converging a busy host
+    does not starve the services on it.  Limits are given with the limits= argument of any resource,
+    collection, role or policy, and in the [limits] section of ~/.opsmop/defaults.toml:
+
+        Shell("make", limits=dict(nice=10, io_class='idle', memory_max='2G', cpu_max=50))
+
+        nice       - scheduling niceness, from -20 to 19
+        io_class   - IO scheduling class, 'idle', 'best-effort' or 'realtime' (Linux)
+        io_level   - priority within best-effort or realtime, from 0 (highest) to 7
+        memory_max - a cgroup v2 memory cap, in bytes or as a size such as '512M'
+        cpu_max    - a cgroup v2 CPU cap, in percent of one CPU (200 is two CPUs)
+
+    For each limit the value given closest to the resource wins, so a resource can change one limit
+    set by its role and keep the rest.  Limits are applied to each command before it runs (see
+    opsmop.core.fork_server) so everything it starts has them too, and the Result of each command
+    records the limits that were applied.  Limits that could not be applied are echoed with the
+    output of the command.
+    """
+
+    @classmethod
+    def check(cls, resource):
+        """
+        Raises a ValidationError if the limits of a resource are not sensical.
+        """
+        limits = resource.limits
+        if not limits:
+            return
+        if type(limits) != dict:
+            raise ValidationError(resource, "limits must be a dict, got: %s" % limits)
+        for (k, v) in limits.items():
+            if k not in CHECKS:
+                raise ValidationError(resource, "unknown limit: %s" % k)
+            (test, expected) = CHECKS[k]
+            if not test(v):
+                raise ValidationError(resource, "limit %s must be %s, got: %s" % (k, expected, v))
+
+    @classmethod
+    def for_resource(cls, resource):
+        """
+        The limits for the commands the provider of a resource runs.  Empty if there are none.
+        """
+        chain = []
+        ptr = resource
+        while ptr is not None:
+            if ptr.limits:
+                chain.append(ptr.limits)
+            ptr = ptr.parent()
+        result = dict(UserDefaults.limits())
+        for limits in reversed(chain):
+            result.update(limits)
+        return result
+
+    @classmethod
+    def missing(cls, limits, applied):
+        """
+        The names of the limits that were asked for and not applied, in order.  io_level does not
+        apply to the idle class, so it is not counted when that class was applied.
+        """
+        applied = applied or dict()
+        return [ k for k in limits if k not in applied and not (k == 'io_level' and applied.get('io_class') == 'idle') ]
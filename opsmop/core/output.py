@@ -0,0 +1,132 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import os
+import tempfile
+import weakref
+
+# defaults for the [output] settings in defaults.toml, see opsmop.client.user_defaults
+MEMORY_LIMIT = 1024 * 1024
+EXCERPT_HEAD = 4096
+EXCERPT_TAIL = 16384
+
+def _remove(path):
+    # the temporary file of a buffer that has been garbage collected
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class OutputBuffer(object):
+
+    """
+    Collects the output of a command.  Output is kept in memory up to a limit (in characters)
+    and anything past that sends all of it to a temporary file, so a command printing hundreds
+    of megabytes does not need hundreds of megabytes.  The start and end of the output are
+    always kept in memory for excerpt(), which is what Result.to_dict() and so the callbacks
+    and event stream see.  getvalue() returns all of the output, reading it back if needed.
+
+    The temporary file is only open while the command runs: close() is called when it finishes,
+    and getvalue() opens the file again for as long as it takes to read it, so results kept
+    for the whole run (with 'register', say) do not hold a file descriptor each.  What remains
+    is the file itself, on disk until the buffer is garbage collected.
+    """
+
+    __slots__ = [ '_chunks', '_file', '_path', '_size', '_limit', '_head', '_head_limit', '_tail', '_tail_size', '_tail_limit', '_blank', '__weakref__' ]
+
+    def __init__(self, limit=MEMORY_LIMIT, head=EXCERPT_HEAD, tail=EXCERPT_TAIL):
+        self._chunks = []
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._limit = limit
+        self._head = ""
+        self._head_limit = head
+        self._tail = collections.deque()
+        self._tail_size = 0
+        self._tail_limit = tail
+        self._blank = True
+
+    def __len__(self):
+        return self._size
+
+    def __reduce__(self):
+        # a buffer sent to another process (or pickled) arrives as the text it holds
+        return (str, (self.getvalue(),))
+
+    def write(self, text):
+        """ text is whatever was read from the command, which need not be whole lines """
+        if not text:
+            return
+        self._size = self._size + len(text)
+        if self._blank and not text.isspace():
+            self._blank = False
+        if len(self._head) < self._head_limit:
+            self._head = self._head + text[0:self._head_limit - len(self._head)]
+        tail = self._tail
+        tail.append(text)
+        self._tail_size = self._tail_size + len(text)
+        while self._tail_size - len(tail[0]) >= self._tail_limit:
+            self._tail_size = self._tail_size - len(tail.popleft())
+        if self._path is not None:
+            self._open("a").write(text)
+            return
+        self._chunks.append(text)
+        if self._size > self._limit:
+            self._spill()
+
+    def _spill(self):
+        (fd, self._path) = tempfile.mkstemp(prefix='opsmop-output-')
+        weakref.finalize(self, _remove, self._path)
+        self._file = open(fd, "w", encoding='utf-8', errors='replace')
+        for chunk in self._chunks:
+            self._file.write(chunk)
+        self._chunks = []
+
+    def _open(self, mode):
+        if self._file is None:
+            self._file = open(self._path, mode, encoding='utf-8', errors='replace')
+        return self._file
+
+    def close(self):
+        """ Called once nothing more will be written, closes the temporary file if there is one """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_blank(self):
+        """ True if nothing but whitespace was written """
+        return self._blank
+
+    def getvalue(self):
+        if self._path is None:
+            if len(self._chunks) > 1:
+                self._chunks = [ "".join(self._chunks) ]
+            return self._chunks[0] if self._chunks else ""
+        if self._file is not None:
+            self._file.flush()
+        with open(self._path, encoding='utf-8', errors='replace') as fd:
+            return fd.read()
+
+    def excerpt(self):
+        """
+        Returns all of the output if it is short, otherwise its start and end with a note of
+        how much was left out in between.
+        """
+        if self._size <= self._head_limit + self._tail_limit:
+            return self.getvalue()
+        tail = "".join(self._tail)[-self._tail_limit:]
+        omitted = self._size - len(self._head) - len(tail)
+        return "%s\n... (%s characters omitted) ...\n%s" % (self._head, omitted, tail)
@@ -0,0 +1,116 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+
+from opsmop.client.user_defaults import UserDefaults
+from opsmop.core.common import Singleton
+
+
+class PlanCache(metaclass=Singleton):
+
+    """
+    The plan cache remembers, per host, a fingerprint of every resource that was last seen
+    converged.  When a provider reports the same fingerprint again, nothing it depends on has
+    changed and the Executor can skip calling plan().
+
+    Providers opt in by implementing Provider.fingerprint().  The cache is stored as a JSON
+    file on the managed host and is only used when enabled in defaults.toml:
+
+        [cache]
+        plan_cache = true
+        # path = "~/.opsmop/plan_cache.json"
+    """
+
+    __slots__ = [ '_path', '_entries', '_dirty' ]
+
+    def __init__(self):
+        self._path = UserDefaults.plan_cache_path()
+        self._entries = None
+        self._dirty = False
+
+    def enabled(self):
+        return self._path is not None
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = dict()
+        if os.path.exists(self._path):
+            try:
+                with open(self._path) as fd:
+                    self._entries = json.load(fd)
+            except ValueError:
+                # a damaged cache only costs us a full plan
+                self._entries = dict()
+        return self._entries
+
+    def _key(self, provider):
+        return "%s:%s" % (provider.__class__.__name__, getattr(provider, 'name', None))
+
+    def _digest(self, fingerprint):
+        data = json.dumps(fingerprint, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def fingerprint(self, provider):
+        """
+        Returns the digest of the provider's fingerprint, or None if the provider must always plan.
+        """
+        if not self.enabled():
+            return None
+        fingerprint = provider.fingerprint()
+        if fingerprint is None:
+            return None
+        fingerprint['provider'] = "%s.%s" % (provider.__class__.__module__, provider.__class__.__name__)
+        return self._digest(fingerprint)
+
+    def is_converged(self, provider, digest):
+        """
+        True if the provider was converged the last time it was seen with this exact fingerprint.
+        """
+        if digest is None:
+            return False
+        return self._load().get(self._key(provider), None) == digest
+
+    def record(self, provider, digest):
+        """
+        Remember the provider as converged with the given fingerprint.
+        """
+        if digest is None:
+            return
+        self._load()[self._key(provider)] = digest
+        self._dirty = True
+
+    def forget(self, provider):
+        if not self.enabled():
+            return
+        if self._load().pop(self._key(provider), None) is not None:
+            self._dirty = True
+
+    def save(self):
+        """
+        Write the cache out at the end of a policy, replacing the old file atomically.
+        """
+        if not self.enabled() or not self._dirty:
+            return
+        dirname = os.path.dirname(self._path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname, 0o770)
+        temp_path = "%s.tmp" % self._path
+        with open(temp_path, "w") as fd:
+            json.dump(self._entries, fd)
+        os.replace(temp_path, self._path)
+        self._dirty = False
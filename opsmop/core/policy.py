@@ -26,6 +26,8 @@ from opsmop.facts.user_facts import UserFacts
 
 class Policy(Collection):
 
+    __slots__ = []
+
     DEFAULT_DENY_FILESERVING_PATTERNS = [ '*.py', "*__pycache__*", '*.pyo', '*.pyc', '.git', '.bak', '.swp' ]
 
     def __init__(self, **kwargs):
@@ -12,26 +12,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import jinja2
-
-from opsmop.core.fields import COMMON_FIELDS
+from opsmop.core.fields import COMMON_FIELDS, Fields
 from opsmop.core.context import Context
 
 class Resource(object):
 
+    # field values are kept in _values, see opsmop.core.fields.FieldValue.  Types in opsmop
+    # declare __slots__ too, so resources do not need a __dict__ (subclasses in policies still get one).
+    __slots__ = [ 'kwargs', '_scope', '_field_spec', '_values' ]
+
     def __init__(self,  *args, **kwargs):
         self.setup(*args, **kwargs)
 
     def setup(self, **kwargs):
         self.kwargs = kwargs
-        self.facts = None
-        self.condition_stack = []
-        self._variables = dict()
         self._scope = None
-        self._field_spec = self.fields()
+        self._field_spec = Fields.for_resource(self)
         self._field_spec.find_unexpected_keys(self)
         self._field_spec.load_parameters(self)
 
+    def __setstate__(self, state):
+        (attributes, slots) = state
+        if attributes:
+            self.__dict__.update(attributes)
+        for (k, v) in slots.items():
+            object.__setattr__(self, k, v)
+        if type(self) not in Fields._compiled:
+            self._field_spec.install(type(self))
+
     def quiet(self):
         """ If true, surpresses some callbacks """
         return False
@@ -121,6 +129,13 @@ class Resource(object):
         """
         pass
 
+    def validation_paths(self):
+        """
+        Paths of any files validate() looks at.  A role is validated again whenever one
+        of these changes, see opsmop.core.validation_cache.
+        """
+        return []
+
     def should_process_when(self):
         """
         A subclassable hook to conditionally skip a resource. Useful for lazy
@@ -179,14 +194,10 @@ class Resource(object):
         if when is None:
             return True
         if type(when) == str:
-            try:
-                return Eval(self.when).evaluate(self)
-            except jinja2.exceptions.UndefinedError:
-                if not validate:
-                    raise
-                # this value may need to late bind, we'll catch it later
-                return True
-        elif issubclass(type(when), Lookup):
+            when = Eval(when)
+        if issubclass(type(when), Lookup):
+            # evaluating a lookup has already imported this
+            import jinja2
             try:
                 return when.evaluate(self)
             except jinja2.exceptions.UndefinedError:
@@ -224,6 +235,21 @@ class Resource(object):
             ptr = ptr.parent()
         return result
 
+    def is_barrier(self):
+        """
+        When a role runs resources in parallel, a barrier waits for all resources declared before it
+        and runs alone.  Anything that changes variables must be a barrier.
+        """
+        return self.register is not None
+
+    def batch_key(self):
+        """
+        Resources whose providers can plan and apply many resources at once return a key here.
+        Sibling resources next to each other with the same key are processed together, see
+        Executor.execute_batch.  None, the default, processes the resource on its own.
+        """
+        return None
+
     def pre(self):
         """
         user hook. called before executing a resource in Executor code
@@ -242,5 +268,7 @@ class Resource(object):
         for (k,v) in self.kwargs.items():
             if hasattr(v, 'to_dict'):
                 v = v.to_dict()
+            elif type(v) == list:
+                v = [ x.to_dict() if hasattr(x, 'to_dict') else x for x in v ]
             result[k] = v
         return result
@@ -23,4 +23,4 @@ class Resources(Collection):
     See demo/content.py for an example.
     """
 
-    pass
+    __slots__ = []
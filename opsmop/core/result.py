@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.core.output import OutputBuffer
+
 class Result(object):
 
     """
@@ -19,9 +21,9 @@ class Result(object):
     in which case there should be an array of results (FIXME?)   
     """
 
-    __slots__ = [ 'rc', 'provider', 'resource', 'data', 'fatal', 'message', 'data', 'primary', 'reason', 'changed', 'actions' ]
+    __slots__ = [ 'rc', 'provider', 'resource', '_data', 'fatal', 'message', 'primary', 'reason', 'changed', 'actions', 'elapsed', 'timed_out', 'limits' ]
 
-    def __init__(self, provider, changed=None, message=None, rc=None, data=None, fatal=False, primary=True, reason=None, actions=None):
+    def __init__(self, provider, changed=None, message=None, rc=None, data=None, fatal=False, primary=True, reason=None, actions=None, elapsed=None, timed_out=False, limits=None):
 
         """
         A result can be constructed with many parameters, most of which have reasonable defaults:
@@ -29,12 +31,15 @@ class Result(object):
         provider - a reference to the provider object (required)
         resource - a reference to the resource the provider is executing (required)
         rc - the return code of any CLI command
-        data - the output of a CLI command, or any structured data for use with 'register'
+        data - the output of a CLI command (as an OutputBuffer), or any structured data for use with 'register'
         fatal - a flag that indicates the result should probably end the program, but it is up to the callback code
         primary - indicates that the result is the final return of a module, as opposed to an intermediate command result
         reason - if set, the lookup used in evaluating the failure status of the result (for failed_when, etc). 
         changed - did any resources change?
         actions - what actions were run?
+        elapsed - for a CLI command, how many seconds it ran
+        timed_out - True if a CLI command was stopped for running past its timeout
+        limits - for a CLI command with limits (see opsmop.core.limits), the ones that were applied
         """
         self.provider = provider
         self.resource = provider.resource
@@ -46,6 +51,28 @@ class Result(object):
         self.changed = changed
         self.actions = actions
         self.reason = None
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.limits = limits
+
+    @property
+    def data(self):
+        """ the output of a command, all of it, or whatever data the result was given """
+        data = self._data
+        if type(data) == OutputBuffer:
+            return data.getvalue()
+        return data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def excerpt(self):
+        """ like data, but only the start and end of long command output """
+        data = self._data
+        if type(data) == OutputBuffer:
+            return data.excerpt()
+        return data
 
     def is_ok(self):
         return not self.fatal
@@ -59,6 +86,8 @@ class Result(object):
             msg = ", reason: %s" % self.reason
         if self.rc is not None:
             rc_msg = ", rc=%s" % self.rc
+        if self.timed_out:
+            rc_msg = "%s, timed out" % rc_msg
         if self.is_ok():
             return "ok%s%s" % (rc_msg, msg)
         else:
@@ -68,4 +97,4 @@ class Result(object):
         reason = self.reason
         if self.reason is not None:
             reason = self.reason.to_dict()
-        return dict(cls=self.__class__.__name__, rc=self.rc, data=self.data, actions=self.actions, changed=self.changed, fatal=self.fatal, message=self.message, reason=reason)
+        return dict(cls=self.__class__.__name__, rc=self.rc, data=self.excerpt(), actions=self.actions, changed=self.changed, fatal=self.fatal, message=self.message, reason=reason, elapsed=self.elapsed, timed_out=self.timed_out, limits=self.limits)
@@ -31,6 +31,8 @@ class Role(Collection):
     For an example see demo/content.py
     """
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         (original, common) = self.split_common_kwargs(kwargs)
         self.setup(extra_variables=original, **common)
@@ -48,6 +50,11 @@ class Role(Collection):
         # number of hosts to simultaenously execute
         return 80
 
+    def parallel(self):
+        # number of resources to simultaneously execute within this role on each host.
+        # 1 keeps strict declaration order, see opsmop.core.scheduler for how ordering is kept otherwise
+        return 1
+
     def set_variables(self):
         return dict()
 
@@ -22,4 +22,5 @@ class Roles(Collection):
 
     For an example see demo/content.py
     """
-    pass
+
+    __slots__ = []
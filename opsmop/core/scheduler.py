@@ -0,0 +1,134 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+
+from opsmop.core.errors import ValidationError
+
+
+class Scheduler(object):
+
+    """
+    The Scheduler runs the leaf resources of one role on a pool of worker threads.
+    It is used by the Executor when Role.parallel() returns a value greater than 1.
+
+    Resources are submitted in declaration order.  Ordering is preserved where it matters:
+
+    * a resource waits for every resource listed in its 'requires' field
+    * a resource that is a barrier (see Resource.is_barrier) waits for everything submitted
+      before it, runs alone, and finishes before anything after it is submitted.  Set() and
+      any resource using 'register' are barriers, so variables are never read while they change.
+    """
+
+    __slots__ = [ '_pool', '_futures', '_pending', '_order', '_pruned', '_stopped' ]
+
+    def __init__(self, program, workers):
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._futures = dict()
+        self._pending = []
+        # declaration order of every resource in the role, used to check 'requires'
+        self._order = { id(step.resource): i for (i, step) in enumerate(program.steps) }
+        # a program cut down by --tags does not hold the resources that were not selected
+        self._pruned = program.pruned
+        # set by the first failure, so workers do not start anything else while the pool stops
+        self._stopped = False
+
+    def _dependencies(self, resource):
+        """
+        Returns the futures of the resources this resource requires.  Required resources
+        that were skipped (because of conditions or tags) are not waited on.
+        """
+        requires = resource.requires
+        if requires is None:
+            return []
+        if type(requires) != list:
+            requires = [ requires ]
+        position = self._order[id(resource)]
+        results = []
+        for required in requires:
+            if self._pruned and id(required) not in self._order:
+                # not selected by tags, so it will not run at all
+                continue
+            if self._order.get(id(required), position) >= position:
+                raise ValidationError(resource, "requires= must reference a resource declared earlier in the same role: %s" % required)
+            future = self._futures.get(id(required), None)
+            if future is not None:
+                results.append(future)
+        return results
+
+    def _run(self, fn, resource, dependencies):
+        # result() re-raises any failure of a dependency, so dependents do not run either
+        for future in dependencies:
+            future.result()
+        if self._stopped:
+            raise concurrent.futures.CancelledError()
+        try:
+            return fn(resource)
+        except BaseException:
+            self._stopped = True
+            raise
+
+    def _failed(self, future):
+        return future.done() and (future.cancelled() or future.exception() is not None)
+
+    def _stop(self, futures):
+        """
+        Called once anything in futures has failed.  Stops the pool, then raises the first real
+        failure in submission order.  Resources that were cancelled because of it, before or
+        while waiting on their 'requires', are passed over.
+        """
+        self.shutdown()
+        for future in futures:
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None and not isinstance(error, concurrent.futures.CancelledError):
+                future.result()
+
+    def _raise_failures(self):
+        """
+        Stop submitting work as soon as any finished resource has failed.
+        """
+        if any(self._failed(future) for future in self._pending):
+            self._stop(self._pending)
+
+    def submit(self, resource, fn):
+        """
+        Schedule fn(resource), which will be the Executor's per-resource method.
+        """
+        self._raise_failures()
+        if resource.is_barrier():
+            self.wait()
+            fn(resource)
+            return
+        future = self._pool.submit(self._run, fn, resource, self._dependencies(resource))
+        self._futures[id(resource)] = future
+        self._pending.append(future)
+
+    def wait(self):
+        """
+        Block until everything submitted so far is complete, raising the first failure.  Once
+        anything fails, resources that have not started yet do not start at all.
+        """
+        pending = self._pending
+        self._pending = []
+        concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_EXCEPTION)
+        if any(self._failed(future) for future in pending):
+            self._stop(pending)
+
+    def shutdown(self):
+        """
+        Drops resources that have not started and waits for those that have.
+        """
+        self._pool.shutdown(wait=True, cancel_futures=True)
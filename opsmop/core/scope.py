@@ -14,9 +14,20 @@
 
 class Scope(object):
 
-    """ Scope is used to prepare variable stacks during the executor phase to implement variable scoping rules """
+    """
+    Scope is used to prepare variable stacks during the executor phase to implement variable scoping rules.
 
-    __slots__ = [ '_parent', '_level', '_resource', '_variables', '_role', '_root', '_ancestors']
+    Each Scope holds only the variables set at its own level (a layer) and a link to its parent,
+    so creating a deeper scope does not copy anything.  Lookups walk up the layers, and the
+    merged view returned by variables() is cached until any scope's variables change.
+    """
+
+    __slots__ = [ '_parent', '_level', '_resource', '_variables', '_role', '_root', '_merged' ]
+
+    # bumped whenever variables change in any scope, so cached merges can be checked cheaply
+    _generation = 0
+    # bumped per variable name, so cached conditions can tell if a name they use was changed
+    _name_versions = dict()
 
     def __init__(self, variables=None, level=0, parent=None, resource=None):
 
@@ -29,6 +40,7 @@ class Scope(object):
         self._variables = variables
         self._role = None
         self._root = None
+        self._merged = None
 
         from opsmop.core.policy import Policy
         from opsmop.core.role import Role
@@ -40,16 +52,16 @@ class Scope(object):
 
         if issubclass(type(resource), Policy):
             self._root = resource
-            self._ancestors = [ ]
         elif self._parent:
             self._root = self._parent._root
-            self._ancestors = self._parent._ancestors[:]
-            self._ancestors.append(self._parent)
 
         # load the resource variables into the scope
         # set_variables method on the object win out over keyword args
-        self.update_variables(resource.variables)
-        self.update_variables(resource.extra_variables)
+        # (a new layer cannot be in any cached merge yet, so this does not bump the generation)
+        if resource.variables:
+            self._variables.update(resource.variables)
+        if resource.extra_variables:
+            self._variables.update(resource.extra_variables)
 
     def resource(self):
         return self._resource
@@ -65,33 +77,86 @@ class Scope(object):
         return cls(variables=resource.variables, level=0, parent=None, resource=resource)
 
     def top_level_scope(self):
-        if self.parent() is None:
-            return self
-        else:
-            return self.parent().top_level_scope()
+        scope = self
+        while scope._parent is not None:
+            scope = scope._parent
+        return scope
 
     def top_level_resource(self):
         top_scope = self.top_level_scope()
         return top_scope._resource
         
     def deeper_scope_for(self, resource):            
-        return Scope(variables=self._variables.copy(), level=self._level+1, parent=self, resource=resource)
+        return Scope(level=self._level+1, parent=self, resource=resource)
 
     def ancestors(self):
-        return self._ancestors
+        results = []
+        scope = self._parent
+        while scope is not None:
+            results.append(scope)
+            scope = scope._parent
+        results.reverse()
+        return results
 
     def root_scope(self):
         return self._root
 
-    def variables(self):
-        scopes = self.ancestors()
-        scopes.append(self)
-        vstack = [ s._variables for s in scopes] 
-        results = dict()
-        for variables in vstack:
-            results.update(variables)
+    def get(self, name, default=None):
+        """
+        Look up one variable, nearest layer first, without building the merged view.
+        """
+        scope = self
+        while scope is not None:
+            variables = scope._variables
+            if name in variables:
+                return variables[name]
+            scope = scope._parent
+        return default
+
+    def owner(self, name):
+        """
+        Returns the scope whose own layer defines name, or None.
+        """
+        scope = self
+        while scope is not None:
+            if name in scope._variables:
+                return scope
+            scope = scope._parent
+        return None
+
+    @classmethod
+    def name_version(cls, name):
+        return cls._name_versions.get(name, 0)
+
+    def _merge(self):
+        generation = Scope._generation
+        # find the nearest scope with an up to date merge, then build downwards from there
+        stale = []
+        scope = self
+        results = None
+        while scope is not None:
+            merged = scope._merged
+            if merged is not None and merged[0] == generation:
+                results = merged[1]
+                break
+            stale.append(scope)
+            scope = scope._parent
+        for scope in reversed(stale):
+            if results is None:
+                results = dict()
+            else:
+                results = results.copy()
+            results.update(scope._variables)
+            scope._merged = (generation, results)
         return results
 
+    def variables(self):
+        """
+        Returns all variables visible at this scope, with deeper levels winning.
+        The result is a new dict that the caller is free to modify.
+        """
+        return self._merge().copy()
+
     def update_parent_variables(self, variables):
         """
         Resources setting/registering variables should always update the scope one level up.
@@ -102,7 +167,13 @@ class Scope(object):
         """
         Variables on a Resource should update just that resource.
         """
+        if not variables:
+            return
         self._variables.update(variables)
+        Scope._generation = Scope._generation + 1
+        versions = Scope._name_versions
+        for name in variables:
+            versions[name] = versions.get(name, 0) + 1
         
     def update_global_variables(self, variables):
         root = self.root_scope()
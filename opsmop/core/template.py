@@ -12,8 +12,50 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from jinja2 import BaseLoader, Environment, FileSystemLoader, StrictUndefined
-from jinja2.nativetypes import NativeEnvironment
+import functools
+import itertools
+import os
+
+from opsmop.core.tracer import Tracer
+
+# how many compiled templates of each kind to keep
+CACHE_SIZE = 512
+
+# how many of the pieces Jinja2 renders Template.stream_string joins before handing them out
+STREAM_PIECES = 8192
+
+@functools.lru_cache(maxsize=None)
+def _env(kind):
+    """
+    Environments are shared by the whole process, and made (importing Jinja2) the first time a
+    template is used.  Jinja2's own template cache is turned off for files, as the functions
+    below cache by absolute path and modification time instead.
+    """
+    from jinja2 import BaseLoader, Environment, FileSystemLoader, StrictUndefined
+    if kind == 'native':
+        from jinja2.nativetypes import NativeEnvironment
+        return NativeEnvironment(loader=BaseLoader, undefined=StrictUndefined)
+    elif kind == 'file':
+        return Environment(loader=FileSystemLoader(searchpath="./"), undefined=StrictUndefined, cache_size=0)
+    return Environment(loader=BaseLoader, undefined=StrictUndefined)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile_string(msg):
+    return _env('string').from_string(msg)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile_native(msg):
+    return _env('native').from_string("{{ %s }}" % msg)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _native_names(msg):
+    from jinja2 import meta
+    return frozenset(meta.find_undeclared_variables(_env('native').parse("{{ %s }}" % msg)))
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _compile_file(abspath, mtime, path):
+    # abspath and mtime are only part of the key, so an edited file is compiled again
+    return _env('file').get_template(path)
 
 
 class Template(object):
@@ -26,21 +68,67 @@ class Template(object):
 
     @classmethod
     def from_string(cls, msg, resource):
-        j2 = Environment(loader=BaseLoader, undefined=StrictUndefined).from_string(msg)
-        context = cls._get_context(resource)
-        return j2.render(context)
+        with Tracer().span('from_string', 'template'):
+            j2 = _compile_string(msg)
+            context = cls._get_context(resource)
+            return j2.render(context)
+
+    @classmethod
+    def stream_string(cls, msg, resource):
+        """
+        Like from_string, but yields the result a block at a time instead of joining it into one string.
+        """
+        with Tracer().span('stream_string', 'template'):
+            j2 = _compile_string(msg)
+            context = cls._get_context(resource)
+            pieces = j2.generate(context)
+            while True:
+                block = list(itertools.islice(pieces, STREAM_PIECES))
+                if not block:
+                    break
+                yield "".join(block)
         
     @classmethod
     def from_file(cls, path, resource):
-        loader = FileSystemLoader(searchpath="./")
-        env = Environment(loader=loader, undefined=StrictUndefined)
-        template = env.get_template(path)
-        context = cls._get_context(resource)
-        return template.render(context)
+        abspath = os.path.abspath(path)
+        try:
+            mtime = os.stat(abspath).st_mtime_ns
+        except OSError:
+            # let Jinja2 report the missing template
+            mtime = None
+        with Tracer().span(path, 'template'):
+            template = _compile_file(abspath, mtime, path)
+            context = cls._get_context(resource)
+            return template.render(context)
 
     @classmethod
     def native_eval(cls, msg, resource):
-        msg = "{{ %s }}" % msg
-        j2 = NativeEnvironment(loader=BaseLoader, undefined=StrictUndefined).from_string(msg)
-        context = cls._get_context(resource)
-        return j2.render(context)
+        with Tracer().span('native_eval', 'template'):
+            j2 = _compile_native(msg)
+            context = cls._get_context(resource)
+            return j2.render(context)
+
+    @classmethod
+    def native_names(cls, msg):
+        """
+        Returns the names of the variables an expression for native_eval refers to.
+        """
+        return _native_names(msg)
+
+    @classmethod
+    def cache_info(cls):
+        """
+        Returns hit/miss statistics for the compiled template caches, by kind of template.
+        """
+        return dict(
+            string = _compile_string.cache_info(),
+            native = _compile_native.cache_info(),
+            file = _compile_file.cache_info()
+        )
+
+    @classmethod
+    def cache_clear(cls):
+        _compile_string.cache_clear()
+        _compile_native.cache_clear()
+        _native_names.cache_clear()
+        _compile_file.cache_clear()
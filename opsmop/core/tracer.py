@@ -0,0 +1,215 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import threading
+import time
+
+from opsmop.core.common import Singleton
+
+
+class Span(object):
+
+    """
+    One timed piece of work.  Used as a context manager, see Tracer.span.
+    """
+
+    __slots__ = [ 'name', 'category', 'host', 'args', 'start', 'end', 'thread', '_tracer' ]
+
+    def __init__(self, tracer, name, category, host, args):
+        self._tracer = tracer
+        self.name = name
+        self.category = category
+        self.host = host
+        self.args = args
+        self.start = None
+        self.end = None
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.end = time.time()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self._tracer.record(self.to_dict())
+        return False
+
+    def to_dict(self):
+        return dict(name=self.name, cat=self.category, host=self.host, args=self.args, start=self.start, end=self.end, tid=self.thread)
+
+
+class _NoSpan(object):
+
+    """
+    Stands in for a Span when tracing is off, so instrumented code costs next to nothing.
+    """
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer(metaclass=Singleton):
+
+    """
+    The Tracer records spans of time spent in policies, roles, host connections, resources,
+    templates and commands when a run is started with --trace.  In push mode each host
+    records its own spans and sends them back over the event stream at the end of the role.
+
+    The spans can be written out in the Chrome trace event format (load the file in
+    chrome://tracing or https://ui.perfetto.dev) and summarized as tables of the slowest
+    resources and hosts.
+    """
+
+    __slots__ = [ '_enabled', '_spans', '_lock', '_host' ]
+
+    def __init__(self):
+        self._enabled = False
+        self._spans = []
+        self._lock = threading.Lock()
+        self._host = None
+
+    def enable(self, enabled=True):
+        self._enabled = enabled
+
+    def enabled(self):
+        return self._enabled
+
+    def set_host(self, host):
+        """
+        Names the host spans are recorded for, unless a span gives its own.
+        """
+        self._host = host
+
+    def span(self, name, category, host=None, **args):
+        """
+        with Tracer().span('Shell', 'resource'):
+            ...
+        """
+        if not self._enabled:
+            return _NO_SPAN
+        if host is None:
+            host = self._host
+        return Span(self, str(name), category, host, args)
+
+    def record(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def mark(self, name, category, start, host=None):
+        """
+        Records a span that started at the given time.time() value and ends now.
+        """
+        if not self._enabled:
+            return
+        if host is None:
+            host = self._host
+        self.record(dict(name=name, cat=category, host=host, args=dict(), start=start, end=time.time(), tid=threading.get_ident()))
+
+    def add(self, spans, host=None):
+        """
+        Adds spans (as dicts) recorded elsewhere, such as on a remote host.
+        """
+        with self._lock:
+            for span in spans:
+                if host is not None:
+                    span['host'] = host
+                self._spans.append(span)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def take(self):
+        """
+        Returns the spans recorded so far and forgets them.
+        """
+        with self._lock:
+            (spans, self._spans) = (self._spans, [])
+        return spans
+
+    def to_chrome(self):
+        """
+        Returns the spans as Chrome trace event JSON data, with one process per host.
+        """
+        events = []
+        pids = dict()
+        for span in self.spans():
+            host = span['host'] or 'local'
+            pid = pids.get(host, None)
+            if pid is None:
+                pid = pids[host] = len(pids) + 1
+                events.append(dict(name='process_name', ph='M', pid=pid, tid=0, args=dict(name=host)))
+            events.append(dict(
+                name = span['name'],
+                cat = span['cat'],
+                ph = 'X',
+                ts = int(span['start'] * 1000000),
+                dur = int((span['end'] - span['start']) * 1000000),
+                pid = pid,
+                tid = span['tid'] or 0,
+                args = span['args']
+            ))
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def export(self, path):
+        with open(path, "w") as fd:
+            json.dump(self.to_chrome(), fd, default=str)
+
+    def slowest_resources(self, count=10):
+        """
+        Returns (seconds, host, resource) for the slowest resources.
+        """
+        results = [ (s['end'] - s['start'], s['host'], s['name']) for s in self.spans() if s['cat'] == 'resource' ]
+        results.sort(key=lambda x: x[0], reverse=True)
+        return results[0:count]
+
+    def slowest_hosts(self, count=10):
+        """
+        Returns (seconds, host) for the hosts with the longest time between their first and last span.
+        """
+        bounds = dict()
+        for span in self.spans():
+            host = span['host']
+            if host is None or host == 'controller':
+                # only managed hosts are of interest here
+                continue
+            (start, end) = bounds.get(host, (span['start'], span['end']))
+            bounds[host] = (min(start, span['start']), max(end, span['end']))
+        results = [ (end - start, host) for (host, (start, end)) in bounds.items() ]
+        results.sort(key=lambda x: x[0], reverse=True)
+        return results[0:count]
+
+    def summary(self, count=10):
+        """
+        Returns the slowest resources and hosts as lines of text.
+        """
+        lines = [ "", "Slowest resources:", "" ]
+        for (seconds, host, name) in self.slowest_resources(count):
+            lines.append("    %9.3fs  %s  %s" % (seconds, host, name))
+        lines.extend([ "", "Slowest hosts:", "" ])
+        for (seconds, host) in self.slowest_hosts(count):
+            lines.append("    %9.3fs  %s" % (seconds, host))
+        return lines
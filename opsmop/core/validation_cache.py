@@ -0,0 +1,171 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import hashlib
+import json
+import os
+
+from opsmop.client.user_defaults import UserDefaults
+from opsmop.core.common import Singleton
+from opsmop.core.context import Context
+from opsmop.core.resource import Resource
+from opsmop.facts.filetests import FileTests
+
+
+class ValidationCache(metaclass=Singleton):
+
+    """
+    The validation cache remembers, per role, a digest of everything validation depends on:
+    the source files of the policy, the role and every resource type in it, the field values
+    of all of them (which can come from arguments, the environment or the command line as
+    well as from source), plus the files resources check for in validate() (see
+    Resource.validation_paths).  If the digest is the same as the last time the role passed
+    validation, it does not need validating again.  Roles are told apart by their class and
+    their field values, so two instances of one Role class have entries of their own.
+
+    The cache is kept where opsmop is run from and is only used when enabled in defaults.toml:
+
+        [cache]
+        validation_cache = true
+        # validation_path = "~/.opsmop/validation_cache.json"
+    """
+
+    __slots__ = [ '_path', '_entries', '_sources' ]
+
+    def __init__(self):
+        self._path = UserDefaults.validation_cache_path()
+        self._entries = None
+        # checksums of source files, by path and stat signature
+        self._sources = dict()
+
+    def enabled(self):
+        return self._path is not None
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = dict()
+        if os.path.exists(self._path):
+            try:
+                with open(self._path) as fd:
+                    self._entries = json.load(fd)
+            except ValueError:
+                # a damaged cache only costs us a validation
+                self._entries = dict()
+        return self._entries
+
+    def _key(self, policy, role):
+        values = json.dumps(self._field_values(role), sort_keys=True)
+        return "%s:%s:%s" % (policy.__class__.__name__, role.__class__.__name__, hashlib.sha256(values.encode()).hexdigest()[:16])
+
+    def _describe(self, value):
+        """
+        A description of a field value that is the same from one run to the next.  Other resources
+        (requires=, the resources of a role) are described by class and name, as they have field
+        values of their own, lookups by their to_dict(), and other objects by their class.
+        """
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        if isinstance(value, Resource):
+            return [ value.__class__.__name__, getattr(value, 'name', None) ]
+        if isinstance(value, (list, tuple)):
+            return [ self._describe(x) for x in value ]
+        if isinstance(value, dict):
+            return { str(k): self._describe(v) for (k, v) in value.items() }
+        if hasattr(value, 'to_dict'):
+            return self._describe(value.to_dict())
+        return "%s.%s" % (value.__class__.__module__, value.__class__.__qualname__)
+
+    def _field_values(self, resource):
+        """
+        The field values of a resource as validate() sees them, before any lookups are evaluated.
+        """
+        names = resource._field_spec.fields.keys()
+        return [ resource.__class__.__name__, { k: self._describe(v) for (k, v) in zip(names, resource._values) } ]
+
+    def _source_checksum(self, cls):
+        import inspect
+        try:
+            path = inspect.getsourcefile(cls)
+        except TypeError:
+            return None
+        if path is None:
+            return None
+        signature = FileTests.stat_signature(path)
+        key = (path, str(signature))
+        checksum = self._sources.get(key, None)
+        if checksum is None and signature is not None:
+            checksum = FileTests.checksum(path)
+            self._sources[key] = checksum
+        return [ path, checksum ]
+
+    def _file_signature(self, path):
+        # Validators.path_exists accepts relative paths from the policy directory as well
+        path = os.path.expandvars(os.path.expanduser(path))
+        results = [ path, FileTests.stat_signature(path) ]
+        root = Context().relative_root()
+        if not path.startswith('/') and root:
+            results.append(FileTests.stat_signature(os.path.join(root, path)))
+        return results
+
+    def digest(self, policy, role, compiled):
+        """
+        Returns the digest of everything validating the role depends on, or None if disabled.
+        """
+        if not self.enabled():
+            return None
+        classes = set([ type(policy), type(role) ])
+        paths = set()
+        values = [ self._field_values(policy), self._field_values(role) ]
+        for program in (compiled.resources, compiled.handlers):
+            for step in program.steps:
+                classes.add(type(step.resource))
+                paths.update(step.resource.validation_paths())
+                values.append(self._field_values(step.resource))
+        data = dict(
+            sources = sorted([ self._source_checksum(cls) for cls in classes ], key=str),
+            files = sorted([ self._file_signature(path) for path in paths ], key=str),
+            values = values
+        )
+        data = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def is_valid(self, policy, role, digest):
+        """
+        True if the role passed validation with exactly this digest.
+        """
+        if digest is None:
+            return False
+        return self._load().get(self._key(policy, role), None) == digest
+
+    def record(self, policy, role, digest):
+        """
+        Remember that the role passed validation, and write the cache out.
+        """
+        if digest is None:
+            return
+        self._load()[self._key(policy, role)] = digest
+        self.save()
+
+    def save(self):
+        if not self.enabled() or self._entries is None:
+            return
+        dirname = os.path.dirname(self._path)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname, 0o770)
+        temp_path = "%s.tmp" % self._path
+        with open(temp_path, "w") as fd:
+            json.dump(self._entries, fd)
+        os.replace(temp_path, self._path)
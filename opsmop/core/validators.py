@@ -14,7 +14,9 @@
 
 import os
 
+from opsmop.core.context import Context
 from opsmop.core.errors import ValidationError
+from opsmop.lookups.lookup import Lookup
 
 
 class Validators(object):
@@ -30,7 +32,13 @@ class Validators(object):
     def path_exists(self, path):
         if path is None:
             return False
+        if issubclass(type(path), Lookup):
+            # computed at runtime, the provider will catch a bad path
+            return True
         # FIXME use the FileTest module, don't duplicate this here
         path = os.path.expandvars(os.path.expanduser(path))
+        if not os.path.exists(path) and not path.startswith('/') and Context().relative_root():
+            # in push mode relative paths are served from the policy directory
+            path = os.path.join(Context().relative_root(), path)
         if not os.path.exists(path):
             raise ValidationError(self.resource, "path does not exist: %s" % path)
@@ -30,6 +30,8 @@ class ChaosFacts(Facts):
     for things like LinuxFacts. When this happens, we can have a "facts/" package.
     """
 
+    volatile = True
+
     def random(self):
         return prandom.random()
 
@@ -14,6 +14,10 @@
 
 class Facts(object):
 
+    # facts whose answers can change between calls without anything on the host changing
+    # (random numbers, for instance) set this, so conditions using them are never cached
+    volatile = False
+
     def constants(self):
         return dict()
 
@@ -19,6 +19,9 @@ import stat
 from opsmop.core.context import Context
 from opsmop.facts.facts import Facts
 
+# how much of a file is read at a time when computing checksums
+BLOCK_SIZE = 1024 * 1024
+
 class FileTestFacts(Facts):
     
     """
@@ -26,6 +29,10 @@ class FileTestFacts(Facts):
     for things like LinuxFacts. When this happens, we can have a "facts/" package.
     """
 
+    def __init__(self):
+        # path -> (what os.stat said when it was read, checksum), see checksum()
+        self._checksums = dict()
+
     def exists(self, fname):
         return os.path.exists(fname)
     
@@ -68,33 +75,82 @@ class FileTestFacts(Facts):
             return None
         return Path(fname).group()
 
-    def checksum(self, fname, blocksize=65535):
-        m = hashlib.sha256()
+    def stat_signature(self, fname):
+        """
+        Returns values that change whenever a path is replaced, written, or has its metadata changed.
+        """
+        if not self.exists(fname):
+            return None
+        st = os.lstat(fname)
+        return [ st.st_ino, st.st_mode, st.st_uid, st.st_gid, st.st_size, st.st_mtime_ns, st.st_ctime_ns ]
+
+    def checksum(self, fname, blocksize=BLOCK_SIZE):
+        """
+        Returns the sha256 of a file, read a block at a time.  The answer is remembered until the file
+        is replaced or written, so a file asked about more than once in a run is only read once.
+        """
         with open(fname, "rb") as f:
+            st = os.fstat(f.fileno())
+            signature = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+            known = self._checksums.get(fname, None)
+            if known is not None and known[0] == signature:
+                return known[1]
+            m = hashlib.sha256()
             block = f.read(blocksize)
             while len(block) > 0:
                 m.update(block)
                 block = f.read(blocksize)
-        return m.hexdigest()
+        digest = m.hexdigest()
+        self._checksums[fname] = (signature, digest)
+        return digest
 
     def string_checksum(self, msg):
         m = hashlib.sha256()
         m.update(msg.encode())
         return m.hexdigest()
 
+    def digest(self, chunks):
+        """
+        Returns the size in bytes and the sha256 of data given a piece at a time, as bytes or as
+        strings (which are encoded as UTF-8), without joining the pieces together.
+        """
+        m = hashlib.sha256()
+        size = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            m.update(chunk)
+            size += len(chunk)
+        return (size, m.hexdigest())
+
+    def matches(self, fname, size, checksum):
+        """
+        Returns whether a file has exactly the given size and sha256, see digest().  A file of another
+        size is not read at all.
+        """
+        try:
+            st = os.stat(fname)
+        except OSError:
+            return False
+        if not stat.S_ISREG(st.st_mode) or st.st_size != size:
+            return False
+        return self.checksum(fname) == checksum
+
     def same_contents(self, dest, src, remote=False):
         if not self.exists(dest):
             return False
-        m = hashlib.sha256()
-        c1 = self.checksum(dest)
         c2 = None
         if not remote:
+            # files of different sizes differ, and neither has to be read to know it
+            if os.path.getsize(dest) != os.path.getsize(src):
+                return False
             c2 = self.checksum(src)
         else:
             # FIXME: this is slightly duplicated with provider code
             if not src.startswith('/'):
                 src = os.path.join(Context().relative_root(), src)
             c2 = Context().get_checksum(src)
-        return (c1 == c2)        
+        c1 = self.checksum(dest)
+        return (c1 == c2)
 
 FileTests = FileTestFacts()
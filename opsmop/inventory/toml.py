@@ -15,8 +15,6 @@
 import logging
 import os
 
-import toml
-
 from opsmop.core.errors import InventoryError
 from opsmop.inventory.inventory import Inventory
 
@@ -34,6 +32,7 @@ class TomlInventory(Inventory):
             return self
         if not os.path.exists(self._path):
             raise InventoryError(msg="TOML inventory does not exist at: %s" % self._path)
+        import toml
         data = open(self._path).read()
         data = toml.loads(data)
         self.accumulate(data)
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from opsmop.core.template import Template
+from opsmop.core.conditions import ConditionCache
 from opsmop.lookups.lookup import Lookup
 
 
@@ -27,7 +27,7 @@ class Eval(Lookup):
         self.expr = expr
 
     def evaluate(self, resource):
-        return Template.native_eval(self.expr, resource)
+        return ConditionCache().evaluate(self.expr, resource)
 
     def __str__(self):
         return "Eval: <'%s'>" % self.expr
@@ -0,0 +1,96 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import grp
+import os
+import pwd
+import threading
+
+from opsmop.core.common import Singleton
+
+PASSWD = "/etc/passwd"
+GROUP = "/etc/group"
+
+class AccountIndex(metaclass=Singleton):
+
+    """
+    The user and group names in /etc/passwd and /etc/group, read once and read again when
+    either file changes on disk, so the user and group providers can plan without running
+    getent for every resource.  Names not in the files are asked of NSS in this process
+    (see the pwd and grp modules), which covers LDAP and other directories as getent did.
+    """
+
+    __slots__ = [ '_tables', '_lock' ]
+
+    def __init__(self):
+        self._tables = dict()
+        self._lock = threading.Lock()
+
+    def _names(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return frozenset()
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._tables.get(path, None)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, self._read(path))
+                self._tables[path] = entry
+            return entry[1]
+
+    def _read(self, path):
+        names = set()
+        with open(path, encoding='utf-8', errors='replace') as fd:
+            for line in fd:
+                name = line.split(":", 1)[0].strip()
+                # lines like +@netgroup hand over to NIS, those names are left to NSS
+                if name and not name.startswith(('#', '+', '-')):
+                    names.add(name)
+        return frozenset(names)
+
+    def user_exists(self, name):
+        if name in self._names(PASSWD):
+            return True
+        try:
+            pwd.getpwnam(name)
+        except KeyError:
+            return False
+        return True
+
+    def group_exists(self, name):
+        if name in self._names(GROUP):
+            return True
+        try:
+            grp.getgrnam(name)
+        except KeyError:
+            return False
+        return True
+
+    def run(self, provider, cmd):
+        """
+        Runs a command for the user or group provider that adds or removes accounts, then
+        invalidates, even if the command failed part of the way through.
+        """
+        try:
+            return provider.run(cmd)
+        finally:
+            self.invalidate()
+
+    def invalidate(self):
+        """
+        Called after adding or removing accounts, in case the files look the same on disk.
+        """
+        with self._lock:
+            self._tables.clear()
@@ -25,6 +25,16 @@ class Directory(Provider):
 
     # ---------------------------------------------------------------
 
+    def fingerprint(self):
+        """ see opsmop.core.plan_cache """
+        if self.recursive:
+            return None
+        data = self.field_values()
+        data['stat'] = FileTests.stat_signature(self.name)
+        return data
+
+    # ---------------------------------------------------------------
+
     def plan(self):
         """ what actions are needed? """
 
@@ -14,7 +14,9 @@
 
 import logging
 import os
+import secrets
 import shutil
+import stat
 from pathlib import Path
 
 from opsmop.core.context import Context
@@ -27,6 +29,69 @@ logger = logging.getLogger('opsmop')
 
 class File(Provider):
 
+    # the template source and the (size, checksum) of its rendering, once known.  The rendering
+    # itself is never kept: it is hashed as it is made, and made again when it has to be written,
+    # see write_template().
+    _template_source = None
+    _template_digest = None
+
+    # ---------------------------------------------------------------
+
+    def template_chunks(self):
+        """ the rendered template, a piece at a time """
+        if self._template_source is None:
+            self._template_source = self.slurp(self.from_template, remote=True)
+        return Template.stream_string(self._template_source, self.resource)
+
+    def template_digest(self):
+        """ the size and checksum of the rendered template, see FileTests.digest """
+        if self._template_digest is None:
+            self._template_digest = FileTests.digest(self.template_chunks())
+        return self._template_digest
+
+    def write_template(self):
+        """
+        Renders the template into a new file next to the destination, hashing it on the way, and
+        then moves that file into place.  A template that fails to render leaves the destination
+        as it was, and the checksum kept (for fingerprint) is that of what was written.
+        """
+        dest = os.path.realpath(self.name)
+        temp = os.path.join(os.path.dirname(dest), ".%s.%s" % (os.path.basename(dest), secrets.token_hex(6)))
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        try:
+            with open(fd, "wb") as data:
+                def blocks():
+                    for chunk in self.template_chunks():
+                        block = chunk.encode('utf-8')
+                        data.write(block)
+                        yield block
+                digest = FileTests.digest(blocks())
+            # a replaced file keeps its mode and, where allowed, its owner
+            try:
+                st = os.stat(dest)
+            except FileNotFoundError:
+                st = None
+            if st is not None:
+                os.chmod(temp, stat.S_IMODE(st.st_mode))
+                try:
+                    os.chown(temp, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass
+            os.replace(temp, dest)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except FileNotFoundError:
+                pass
+            raise
+        self._template_digest = digest
+
+    def content_bytes(self):
+        """ from_content as it is written to the file """
+        if isinstance(self.from_content, bytes):
+            return self.from_content
+        return self.from_content.encode('utf-8')
+
     # ---------------------------------------------------------------  
    
     def should_replace_using_template(self):
@@ -34,16 +99,11 @@ class File(Provider):
 
         if not self.overwrite:
             return False
-
-        data = self.slurp(self.from_template, remote=True)
-
-        self.evaluated_template = Template.from_string(data, self.resource)
-        
+        # rendered even for a missing file, so a broken template fails here and not half way through writing
+        (size, checksum) = self.template_digest()
         if not FileTests.exists(self.name):
             return True
-        original = self.slurp(self.name)
-
-        return original != self.evaluated_template
+        return not FileTests.matches(self.name, size, checksum)
     
     # ---------------------------------------------------------------
 
@@ -53,8 +113,9 @@ class File(Provider):
             return True
         if not self.overwrite:
             return False
-        original = self.slurp(self.name)
-        return original != self.from_content
+        data = self.content_bytes()
+        (size, checksum) = FileTests.digest([ data ])
+        return not FileTests.matches(self.name, size, checksum)
 
     # ---------------------------------------------------------------
 
@@ -80,6 +141,30 @@ class File(Provider):
 
     # ---------------------------------------------------------------
 
+    def fingerprint(self):
+        """ see opsmop.core.plan_cache """
+
+        if self.from_url:
+            # the remote content can change at any time
+            return None
+
+        data = self.field_values()
+        data['stat'] = FileTests.stat_signature(self.name)
+        if self.from_file:
+            if Context().caller():
+                src = self.from_file
+                if not src.startswith('/'):
+                    src = os.path.join(Context().relative_root(), src)
+                data['source'] = Context().get_checksum(src)
+            else:
+                data['source'] = FileTests.checksum(self.from_file)
+        elif self.from_template:
+            # the rendered result depends on variables, so the rendering is what we fingerprint
+            data['source'] = self.template_digest()[1]
+        return data
+
+    # ---------------------------------------------------------------
+
     def plan(self):
         """ what actions are needed? """
 
@@ -145,15 +230,12 @@ class File(Provider):
 
         elif self.should('copy_template'):
             self.do('copy_template')
-            data = open(self.name, "w")  
-            data.write(self.evaluated_template)
-            data.close()
+            self.write_template()
 
         elif self.should('copy_content'):
             self.do('copy_content')
-            data = open(self.name, "w")
-            data.write(self.from_content)
-            data.close()
+            with open(self.name, "wb") as data:
+                data.write(self.content_bytes())
 
         # metadata ...
         
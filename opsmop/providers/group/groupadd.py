@@ -12,25 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.providers.accounts import AccountIndex
 from opsmop.providers.provider import Provider
 
 CREATE = "groupadd {name}"
 REMOVE = "groupdel -f {name}"
-EXISTS = "getent group {name}"
 
 class GroupAdd(Provider):
 
     def _exists(self):
-        test = self.test(EXISTS.format(name=self.name))
-        return test is not None
+        return AccountIndex().group_exists(self.name)
 
     def plan(self):
         exists = self._exists()
         # at this point, no attributes are modified by this resource if they exist
         # this is probably desirable in most cases, but some future attributes
         # should be modifiable.
-        if exists and self.absent:
-            self.needs('remove')
+        if self.absent:
+            if exists:
+                self.needs('remove')
         elif not exists:
             self.needs('add')
 
@@ -38,7 +38,7 @@ class GroupAdd(Provider):
 
         if self.should('remove'):
             self.do('remove')
-            return self.run(REMOVE.format(name=self.name))
+            return AccountIndex().run(self, REMOVE.format(name=self.name))
         elif self.should('add'):
             # patches for additional options would be considered
             self.do('add')
@@ -47,4 +47,4 @@ class GroupAdd(Provider):
                 cmd = cmd + " --gid=%s" % self.gid
             if self.system:
                 cmd = cmd + " --system"
-            return self.run(cmd)
+            return AccountIndex().run(self, cmd)
@@ -12,26 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.providers.package.index import DpkgIndex
 from opsmop.providers.package.package import Package
 
 TIMEOUT = 3600
-VERSION_CHECK = "dpkg -s %s | grep '^Version'"
 UPDATE_CACHE = "apt-get update -q=2"
-INSTALL = "apt-get -q=2 install -y {name}"
-INSTALL_VERSION = "apt-get -q=2 install -y {name}={version}"
-UNINSTALL = "apt-get -q=2 remove -y {name}"
+INSTALL = "apt-get -q=2 install -y {names}"
+UNINSTALL = "apt-get -q=2 remove -y {names}"
 IGNORE_LINES = [ "(Reading database" ]
 
 class Apt(Package):
 
+    # In apt-get, install also performs the task of upgrading a package, so it is re-used
+    COMMANDS = dict(install=INSTALL, upgrade=INSTALL, remove=UNINSTALL)
+    IGNORE_LINES = IGNORE_LINES
+    INDEX = DpkgIndex
     
     def _get_version(self):
 
-        version_check = VERSION_CHECK % self.name
-        output = self.test(version_check)
-        if output is None:
-            return None
-        return output.split(':')[1].strip()
+        return DpkgIndex().version(self, self.name)
  
     def get_default_timeout(self):
 
@@ -41,31 +40,22 @@ class Apt(Package):
 
         super().plan()
 
-    def _get_install_command(self):
+    def _package_spec(self):
 
         if self.version:
-            return INSTALL_VERSION.format(name=self.name, version=self.version)
-        else:
-            return INSTALL.format(name=self.name)
+            return "{name}={version}".format(name=self.name, version=self.version)
+        return self.name
 
-    def apply(self):
+    def _batch_result(self, result):
 
-        which = None
-        if self.should('update_cache'):
-            self.do('update_cache')
-            self.run(UPDATE_CACHE)
-        if self.should('install'):
-            self.do('install')
-            which = self._get_install_command()
-        elif self.should('upgrade'):
-            self.do('upgrade')
-            # In apt-get, install also performs the task of upgrading a single package, so it is re-used
-            which = self._get_install_command()
-        elif self.should('remove'):
-            self.do('remove')
-            which = UNINSTALL.format(name=self.name)
+        return self.ok()
 
-        if which:
-            self.run(which, ignore_lines=IGNORE_LINES)
+    @classmethod
+    def apply_batch(cls, providers):
 
-        return self.ok()
+        updating = [ p for p in providers if p.should('update_cache') ]
+        if updating:
+            for p in updating:
+                p.do('update_cache')
+            updating[0].run(UPDATE_CACHE)
+        return super().apply_batch(providers)
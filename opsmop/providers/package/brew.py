@@ -16,34 +16,44 @@ from opsmop.providers.package.package import Package
 
 TIMEOUT = 1800
 VERSION_CHECK = "brew ls --versions {name} | cut -f2 -d ' '"
-INSTALL = "brew install {name}"
-UPGRADE = "brew update {name}"
-UNINSTALL = "brew uninstall {name}"
+# prints the name and versions of each installed package, and nothing for the others
+VERSIONS_CHECK = "brew ls --versions {names}"
+INSTALL = "brew install {names}"
+UPGRADE = "brew update {names}"
+UNINSTALL = "brew uninstall {names}"
 
 class Brew(Package):
 
+    COMMANDS = dict(install=INSTALL, upgrade=UPGRADE, remove=UNINSTALL)
+
     def _get_version(self):
         version_check = VERSION_CHECK.format(name=self.name)
         return self.test(version_check)
 
+    @classmethod
+    def _get_versions(cls, providers):
+        # packages from a tap (user/tap/foo) are listed by their short name, so those are
+        # looked up one at a time, alongside the query for the rest
+        names = [ p.name for p in providers if '/' not in p.name ]
+        taps = [ p for p in providers if '/' in p.name ]
+        probes = [ tap.test_async(VERSION_CHECK.format(name=tap.name)) for tap in taps ]
+        if names:
+            probes.append(providers[0].test_async(VERSIONS_CHECK.format(names=" ".join(names)), loose=True))
+        if not probes:
+            return dict()
+        results = providers[0].gather(*probes)
+        versions = { tap.name: version for (tap, version) in zip(taps, results) }
+        if names:
+            found = dict()
+            for line in results[-1].splitlines():
+                tokens = line.split()
+                if len(tokens) > 1:
+                    found[tokens[0]] = tokens[1]
+            versions.update({ name: found.get(name, None) for name in names })
+        return versions
+
     def get_default_timeout(self):
         return TIMEOUT
 
     def plan(self):
         super().plan()
-
-    def apply(self):
-        which = None
-        if self.should('install'):
-            self.do('install')
-            which = INSTALL.format(name=self.name)
-        elif self.should('upgrade'):
-            self.do('upgrade')
-            which = UPGRADE.format(name=self.name)
-        elif self.should('remove'):
-            self.do('remove')
-            which = UNINSTALL.format(name=self.name)
-
-        if which:
-            return self.run(which)
-        return self.ok()
@@ -12,40 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.providers.package.index import RpmIndex
 from opsmop.providers.package.package import Package
 
 TIMEOUT = 3600
-VERSION_CHECK = "rpm -q %s"
-QUERY_FORMAT = "--queryformat '%{VERSION}\\n'"
-INSTALL = "dnf install -y {name}"
-UPGRADE = "dnf update -y {name}"
-UNINSTALL = "dnf remove -y {name}"
+INSTALL = "dnf install -y {names}"
+UPGRADE = "dnf update -y {names}"
+UNINSTALL = "dnf remove -y {names}"
 
 
 class Dnf(Package):
 
+    COMMANDS = dict(install=INSTALL, upgrade=UPGRADE, remove=UNINSTALL)
+    INDEX = RpmIndex
+
     def _get_version(self):
-        version_check = "%s %s" % (VERSION_CHECK % self.name, QUERY_FORMAT)
-        output = self.test(version_check)
-        if output is None:
-            return None
-        return output
+        return RpmIndex().version(self, self.name)
 
     def get_default_timeout(self):
         return TIMEOUT
-
-    def apply(self):
-        which = None
-        if self.should('install'):
-            self.do('install')
-            which = INSTALL.format(name=self.name)
-        elif self.should('upgrade'):
-            self.do('upgrade')
-            which = UPGRADE.format(name=self.name)
-        elif self.should('remove'):
-            self.do('remove')
-            which = UNINSTALL.format(name=self.name)
-
-        if which:
-            return self.run(which)
-        return self.ok()
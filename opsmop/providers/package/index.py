@@ -0,0 +1,164 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+
+from opsmop.core.common import Singleton
+
+# what dpkg-query prints for each package, when the status file cannot be read
+DPKG_QUERY = "dpkg-query -W -f='${Package}\\t${Architecture}\\t${Status}\\t${Version}\\n'"
+# lists every installed rpm package
+RPM_QUERY = "rpm -qa --queryformat '%{NAME}\\t%{ARCH}\\t%{VERSION}\\n'"
+
+class PackageIndex(metaclass=Singleton):
+
+    """
+    The installed versions of every package, read once and kept until the package database
+    changes on disk, so planning a Package resource is a dict lookup rather than a command.
+    Subclasses say which files make up the database and how to read it.  Versions are keyed
+    by package name, and by name:arch (apt) or name.arch (rpm) too.
+    """
+
+    __slots__ = [ '_versions', '_stamp', '_lock' ]
+
+    # files that change whenever packages are installed or removed
+    DATABASES = []
+
+    def __init__(self):
+        self._versions = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _get_stamp(self):
+        stamp = []
+        for path in self.DATABASES:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _load(self, provider):
+        """ returns a dict of every installed package to its version, running commands with provider if needed """
+        raise NotImplementedError()
+
+    def versions(self, provider):
+        stamp = self._get_stamp()
+        with self._lock:
+            if self._versions is None or stamp != self._stamp:
+                self._versions = self._load(provider)
+                self._stamp = stamp
+            return self._versions
+
+    def version(self, provider, name):
+        """
+        Returns the installed version of a package, or None if it is not installed.
+        """
+        return self.versions(provider).get(name, None)
+
+    def invalidate(self):
+        """
+        Called after installing or removing packages, in case the database looks the same on disk.
+        """
+        with self._lock:
+            self._versions = None
+
+
+class DpkgIndex(PackageIndex):
+
+    """
+    Installed Debian packages, read from the dpkg status file.
+    """
+
+    __slots__ = []
+
+    DATABASES = [ "/var/lib/dpkg/status" ]
+
+    def _load(self, provider):
+        try:
+            fd = open(self.DATABASES[0], encoding='utf-8', errors='replace')
+        except OSError:
+            return self._query(provider)
+        with fd:
+            return self._parse(fd)
+
+    def _query(self, provider):
+        output = provider.test(DPKG_QUERY, echo=False, loose=True)
+        versions = dict()
+        for line in (output or "").splitlines():
+            tokens = line.split("\t")
+            if len(tokens) == 4:
+                self._add(versions, tokens[0], tokens[1], tokens[2], tokens[3])
+        return versions
+
+    def _parse(self, fd):
+        versions = dict()
+        fields = dict()
+        for line in fd:
+            if line[0:1].isspace():
+                # continuation lines, such as descriptions and conffiles
+                if line.strip() == "":
+                    self._add(versions, fields.get('Package'), fields.get('Architecture'), fields.get('Status'), fields.get('Version'))
+                    fields = dict()
+                continue
+            (k, _, v) = line.partition(":")
+            if k in ('Package', 'Architecture', 'Status', 'Version'):
+                fields[k] = v.strip()
+        self._add(versions, fields.get('Package'), fields.get('Architecture'), fields.get('Status'), fields.get('Version'))
+        return versions
+
+    def _add(self, versions, name, arch, status, version):
+        # packages that were removed but left their configuration files behind are not installed
+        if not name or not version or not status or status.split()[-1] in ('not-installed', 'config-files'):
+            return
+        versions.setdefault(name, version)
+        if arch:
+            versions["%s:%s" % (name, arch)] = version
+
+
+class RpmIndex(PackageIndex):
+
+    """
+    Installed rpm packages, from one query of the rpm database.
+    """
+
+    __slots__ = []
+
+    # the database moved between rpm versions, any of these that exist are watched
+    DATABASES = [
+        "/var/lib/rpm/rpmdb.sqlite",
+        "/var/lib/rpm/Packages",
+        "/usr/lib/sysimage/rpm/rpmdb.sqlite",
+        "/usr/lib/sysimage/rpm/Packages"
+    ]
+
+    def _load(self, provider):
+        output = provider.test(RPM_QUERY, echo=False, loose=True)
+        versions = dict()
+        for line in (output or "").splitlines():
+            tokens = line.split("\t")
+            if len(tokens) != 3:
+                continue
+            (name, arch, version) = tokens
+            # several versions may be installed at once (kernels), these are all listed as before,
+            # but the same version for several architectures is listed once
+            for key in (name, "%s.%s" % (name, arch)):
+                current = versions.get(key, None)
+                if current is None:
+                    versions[key] = version
+                elif version not in current.split("\n"):
+                    versions[key] = "%s\n%s" % (current, version)
+        return versions
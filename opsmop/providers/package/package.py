@@ -12,17 +12,56 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.core.result import Result
 from opsmop.providers.provider import Provider
 
 
 class Package(Provider):
 
+    # commands that take a space separated list of {names}, by action, see apply_batch
+    COMMANDS = dict()
+    IGNORE_LINES = None
+    # the PackageIndex class of the package manager, if it has one
+    INDEX = None
+
+    # set by plan_batch() when the installed version was looked up along with other packages
+    _queried = False
+    _version = None
+
     def _get_version(self):
         raise NotImplementedError()
 
+    @classmethod
+    def _get_versions(cls, providers):
+        """
+        Looks up the installed versions of the packages of many providers with one command.
+        Returns a dict of package name to version (None if not installed) holding the names
+        that could be answered.  The others are looked up with _get_version() as usual.
+        """
+        return dict()
+
+    @classmethod
+    def plan_batch(cls, providers):
+        versions = cls._get_versions(providers)
+        for provider in providers:
+            if provider.name in versions:
+                provider._version = versions[provider.name]
+                provider._queried = True
+
+    def _package_spec(self):
+        """ how to name the package in an install command """
+        return self.name
+
+    def _batch_result(self, result):
+        """ the Result of apply() for this package, given the result of the command that took its action """
+        return Result(self, rc=result.rc, data=result.data, fatal=result.fatal, primary=result.primary)
+
     def plan(self):
 
-        current_version = self._get_version()
+        if self._queried:
+            current_version = self._version
+        else:
+            current_version = self._get_version()
 
         # FIXME: this can probably should advantage of the StrictVersion class to be smarter.
         # Setting the absent parameter on Package should override any other parameters
@@ -38,3 +77,34 @@ class Package(Provider):
                 self.needs('upgrade')
             elif self.version and self.version != current_version:
                 self.needs('upgrade')
+
+    @classmethod
+    def apply_batch(cls, providers):
+        """
+        Takes the install, upgrade or remove action of every provider with one command per action,
+        naming all of the packages that need it.
+        """
+        results = dict()
+        todo = dict()
+        for provider in providers:
+            which = None
+            for action in ('install', 'upgrade', 'remove'):
+                if provider.should(action):
+                    which = action
+                    break
+            if which is None:
+                results[provider] = provider.ok()
+            else:
+                provider.do(which)
+                todo.setdefault(which, []).append(provider)
+        for (which, group) in todo.items():
+            names = " ".join([ provider._package_spec() for provider in group ])
+            result = group[0].run(cls.COMMANDS[which].format(names=names), ignore_lines=cls.IGNORE_LINES)
+            for provider in group:
+                results[provider] = provider._batch_result(result)
+        if todo and cls.INDEX is not None:
+            cls.INDEX().invalidate()
+        return results
+
+    def apply(self):
+        return self.apply_batch([ self ])[self]
@@ -17,12 +17,11 @@ import logging
 import os
 import shutil
 
-import mitogen
-
 from opsmop.callbacks.callbacks import Callbacks
 from opsmop.core.action import Action
 from opsmop.core.command import Command
 from opsmop.core.context import Context
+from opsmop.core.engine import CommandEngine
 from opsmop.core.errors import ProviderError
 from opsmop.core.result import Result
 from opsmop.core.template import Template
@@ -32,6 +31,24 @@ logger = logging.getLogger("opsmop")
 
 DEFAULT_TIMEOUT = 60
 
+class ResourceField(object):
+
+    """
+    Reads a field like self.name of a provider from its resource, so field values are not copied onto
+    every provider.  A value set on the provider (such as an evaluated lookup) is kept on the provider
+    and wins, as this only defines __get__.
+    """
+
+    __slots__ = [ 'name' ]
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj.resource, self.name)
+
 class Provider(object):
 
     def __init__(self, resource):
@@ -45,9 +62,29 @@ class Provider(object):
         self.actions_planned = []
         self.actions_taken = []
         self._context = None
+        for k in type(self).link_fields(resource._field_spec):
+            setattr(self, k, getattr(resource, k))
 
-        # isn't this already copied over - safe to remove?
-        # self.name = getattr(self.resource, 'name', None)
+    @classmethod
+    def link_fields(cls, spec):
+        """
+        Adds a ResourceField for each field in the spec to this provider class itself (never to a base
+        class), which Type.provider() does before making a provider of the class.  Names the class or any
+        base class already defines, even as None, are left alone.  Returns those clashing names, whose
+        values are still copied onto each provider.
+        """
+        linked = cls.__dict__.get('_linked', None)
+        if linked is None or linked[0] is not spec:
+            clashes = []
+            for k in spec.names:
+                owner = next((c for c in cls.__mro__ if k in vars(c)), None)
+                if owner is None:
+                    setattr(cls, k, ResourceField(k))
+                elif type(vars(owner)[k]) != ResourceField:
+                    clashes.append(k)
+            linked = (spec, clashes)
+            cls._linked = linked
+        return linked[1]
 
     def copy_file(self, src, dest):
         """
@@ -55,6 +92,7 @@ class Provider(object):
         """
         caller = Context().caller()
         if caller:
+            import mitogen.service
             bio = open(dest, "wb", buffering=0)     
             if not src.startswith('/'):    
                 src = os.path.join(Context().relative_root(), src)
@@ -70,6 +108,7 @@ class Provider(object):
         """
         caller = Context().caller()
         if caller and remote:
+            import mitogen.service
             bio = io.BytesIO()
             if not src.startswith('/'):    
                 src = os.path.join(Context().relative_root(), src)
@@ -88,6 +127,18 @@ class Provider(object):
         """ for trivial providers like debug, tell the callbacks to not do plan computations """
         return False
 
+    def fingerprint(self):
+        """
+        Providers that can tell when nothing they manage has changed may return a dict describing
+        everything plan() depends on, see opsmop.core.plan_cache. None means plan() always runs.
+        """
+        return None
+
+    def field_values(self):
+        """ the resolved values of the fields defined by the type, for use in fingerprint() """
+        spec = self.resource._field_spec
+        return { k: getattr(self, k) for k in spec.fields.keys() if k not in spec.common_names }
+
     def quiet(self):
         """ if True, a resource claiming it is quiet will silence most properly programmed callbacks. """
         return False
@@ -114,6 +165,33 @@ class Provider(object):
         """ call self.should('foo') for any actions that should be undertaken by .apply() """
         raise NotImplementedError
 
+    @classmethod
+    def prefetch(cls, resources):
+        """
+        Called by the executor before a role runs with every resource in it, handlers included, that
+        uses this provider class.  Providers that can look up the state of many resources with one
+        command may note what to look up here.  Resources may still be skipped, so it is best to wait
+        until plan() asks before running anything.
+        """
+        pass
+
+    @classmethod
+    def plan_batch(cls, providers):
+        """
+        Called before plan() when the executor processes several resources using this provider class
+        together (see Resource.batch_key).  May look up what plan() needs for all of them at once.
+        """
+        pass
+
+    @classmethod
+    def apply_batch(cls, providers):
+        """
+        Takes the planned actions of several providers of this class, marking them off with do() on each,
+        as in apply().  Returns a dict of each provider to its Result.  Providers that can make one change
+        for many resources should override this.
+        """
+        return { provider: provider.apply() for provider in providers }
+
     def error(self, msg):
         raise ProviderError(msg=msg, provider=self)
 
@@ -144,10 +222,13 @@ class Provider(object):
             timeout = self.get_default_timeout()
         return Command(cmd, self, input_text=input_text, timeout=timeout, echo=echo, loud=loud, fatal=fatal, ignore_lines=ignore_lines, primary=primary)
 
-    def _handle_cmd(self, cmd, input_text=None, timeout=None, echo=True, fatal=False, loud=False, loose=False, want_output=False, ignore_lines=None, primary=False):
+    def _handle_cmd(self, cmd, **kwargs):
         """ Common helper code for test and run """
+        return CommandEngine().run(self._handle_cmd_async(cmd, **kwargs))
+
+    async def _handle_cmd_async(self, cmd, input_text=None, timeout=None, echo=True, fatal=False, loud=False, loose=False, want_output=False, ignore_lines=None, primary=False):
         cmd = self.get_command(cmd, input_text=input_text, timeout=timeout, echo=echo, fatal=fatal, loud=loud, ignore_lines=ignore_lines, primary=primary)
-        res = cmd.execute()
+        res = await cmd.execute_async()
         if want_output:
             if res.rc == 0 or loose:
                 return res.data.rstrip()
@@ -171,6 +252,30 @@ class Provider(object):
         """
         return self._handle_cmd(cmd, input_text=input_text, timeout=timeout, echo=echo, fatal=True, loud=loud, ignore_lines=ignore_lines, primary=primary)
 
+    async def test_async(self, cmd, input_text=None, timeout=None, echo=True, loud=False, loose=False, ignore_lines=None):
+        """
+        Like test, but returns a coroutine so several commands can run at once with gather().
+        """
+        return await self._handle_cmd_async(cmd, input_text=input_text, timeout=timeout, echo=echo, loose=loose, loud=loud, want_output=True, ignore_lines=ignore_lines)
+
+    async def run_async(self, cmd, input_text=None, timeout=None, echo=True, loud=False, ignore_lines=None, primary=False):
+        """
+        Like run, but returns a coroutine so several commands can run at once with gather().
+        """
+        return await self._handle_cmd_async(cmd, input_text=input_text, timeout=timeout, echo=echo, fatal=True, loud=loud, ignore_lines=ignore_lines, primary=primary)
+
+    def gather(self, *coroutines):
+        """
+        Waits for coroutines, such as those from test_async() and run_async(), running them at the
+        same time, and returns their results in order.  Useful in plan() for probes that do not
+        depend on each other:
+
+            (a, b) = self.gather(self.test_async("cmd_a"), self.test_async("cmd_b"))
+
+        How many commands run at once is limited, see opsmop.core.engine.
+        """
+        return CommandEngine().gather(coroutines)
+
     def get_default_timeout(self): 
         """
         Each provider class may define a default command timeout for all commands to avoid specifying a timeout
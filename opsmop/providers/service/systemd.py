@@ -12,33 +12,112 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
+from opsmop.core.common import Singleton
+from opsmop.core.context import Context
 from opsmop.core.errors import ProviderError
 from opsmop.providers.service.service import Service
 
-STATUS = "systemctl status {name}"
-IS_ENABLED = "systemctl is-enabled {name}"
+SHOW = "systemctl show --property=Id,LoadState,ActiveState,UnitFileState {names}"
 START = "systemctl start {name}"
 STOP  = "systemctl stop {name}"
 RESTART = "systemctl restart {name}"
 ENABLE = "systemctl enable {name}"
 DISABLE = "systemctl disable {name}"
 
+class UnitCache(metaclass=Singleton):
+
+    """
+    The state of systemd units, looked up for all of the units a role uses with one
+    'systemctl show' the first time a provider asks about any of them.  A unit is looked
+    up again after a provider starts, stops, enables or disables it, and every unit is
+    once any provider has taken actions (see Context.host_state_version), since other
+    changes can affect services too.  The lock only guards the cache itself, so roles
+    running in parallel do not wait on each other's 'systemctl show'.
+    """
+
+    __slots__ = [ '_wanted', '_states', '_version', '_lock' ]
+
+    def __init__(self):
+        self._wanted = set()
+        self._states = dict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def want(self, names):
+        """ notes units to look up along with the next one asked for, see Systemd.prefetch """
+        with self._lock:
+            self._wanted.update(names)
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._states.clear()
+            else:
+                self._states.pop(name, None)
+
+    def state(self, provider, name):
+        """
+        Returns a dict of the LoadState, ActiveState and UnitFileState of a unit.
+        """
+        version = Context().host_state_version()
+        with self._lock:
+            if version != self._version:
+                self._states.clear()
+                self._version = version
+            state = self._states.get(name, None)
+            if state is not None:
+                return state
+            names = [ name ] + sorted(x for x in self._wanted if x != name and x not in self._states)
+        states = self._query(provider, names)
+        if states is None and len(names) > 1:
+            # systemctl refused one of the names, so from now on look units up one at a time
+            with self._lock:
+                self._wanted.clear()
+            states = self._query(provider, [ name ])
+        if states is None:
+            states = { name: dict() }
+        with self._lock:
+            # answers from before a provider took actions are used once, but not kept
+            if self._version == version == Context().host_state_version():
+                self._states.update(states)
+        return states[name]
+
+    def _query(self, provider, names):
+        output = provider.test(SHOW.format(names=" ".join(names)), echo=False, loose=True) or ""
+        # one block of properties per unit, in the order asked for, separated by blank lines
+        blocks = [ block for block in output.split("\n\n") if block.strip() ]
+        if len(blocks) != len(names):
+            return None
+        states = dict()
+        for (name, block) in zip(names, blocks):
+            state = dict()
+            for line in block.splitlines():
+                (k, _, v) = line.partition("=")
+                state[k] = v
+            states[name] = state
+        return states
+
+
 class Systemd(Service):
 
+    @classmethod
+    def prefetch(cls, resources):
+        UnitCache().want([ r.name for r in resources if type(r.name) == str ])
+
     def _get_status(self):
-        status = self.test(STATUS.format(name=self.name), loose=True)
-        if "could not be found" in status:
+        state = UnitCache().state(self, self.name)
+        if state.get('LoadState', 'not-found') == "not-found":
             self.error("service %s could not be found" % self.name)
-        if "Active: active" in status:
+        if state.get('ActiveState') == "active":
             return "running"
         else:
             return "stopped"
 
     def _is_enabled(self, status):
-        enabled = self.test(IS_ENABLED.format(name=self.name))
-        if enabled is None:
-            return False
-        return enabled == "enabled"
+        state = UnitCache().state(self, self.name)
+        return state.get('UnitFileState') == "enabled"
 
     def plan(self):
         super().plan()
@@ -63,5 +142,8 @@ class Systemd(Service):
         elif self.should('disable'):
             self.do('disable')
             self.run(DISABLE.format(name=self.name))
+
+        if self.actions_taken:
+            UnitCache().invalidate(self.name)
         
         return self.ok()
@@ -12,25 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from opsmop.providers.accounts import AccountIndex
 from opsmop.providers.provider import Provider
 
 CREATE = "useradd {name}"
 REMOVE = "userdel {name} --force"
-EXISTS = "getent passwd {name}"
 
 class UserAdd(Provider):
 
     def _exists(self):
-        test = self.test(EXISTS.format(name=self.name))
-        return test is not None
+        return AccountIndex().user_exists(self.name)
 
     def plan(self):
         exists = self._exists()
         # at this point, no attributes are modified by this resource if they exist
         # this is probably desirable in most cases, but some future attributes
         # should be modifiable.
-        if exists and self.absent:
-            self.needs('remove')
+        if self.absent:
+            if exists:
+                self.needs('remove')
         elif not exists:
             self.needs('add')
 
@@ -39,7 +39,7 @@ class UserAdd(Provider):
         if self.should('remove'):
             # if folks want control over using --force and keeping homedirs, patches would be considered.
             self.do('remove')
-            return self.run(REMOVE.format(name=self.name))
+            return AccountIndex().run(self, REMOVE.format(name=self.name))
         elif self.should('add'):
             # patches for additional options would be considered
             self.do('add')
@@ -56,4 +56,4 @@ class UserAdd(Provider):
                 cmd = cmd + " --system"
             if self.shell:
                 cmd = cmd + " --shell=%s" % self.shell
-            return self.run(cmd)
+            return AccountIndex().run(self, cmd)
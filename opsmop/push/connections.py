@@ -33,6 +33,7 @@ from opsmop.callbacks.replay import ReplayCallbacks
 from opsmop.core.context import Context
 from opsmop.core.errors import InventoryError
 from opsmop.core.roles import Roles
+from opsmop.core.tracer import Tracer
 from opsmop.inventory.host import Host
 from opsmop.facts.filetests import FileTestFacts
 
@@ -199,7 +200,7 @@ class ConnectionManager(object):
         return False
 
 
-    def remotify_role(self, host, policy, role, mode):
+    def remotify_role(self, host, policy, role, compiled, mode):
 
         if self.should_exclude_from_limits(host):
             return
@@ -227,18 +228,24 @@ class ConnectionManager(object):
         self.events_select.add(receiver)
         sender = self.status_recv.to_sender()
 
+        # the remote side runs the compiled role, so do not send the whole resource tree
+        (policy, role) = compiled.detach(policy, role)
+
         params = dict(
             host = target_host,
             policy = policy,
             role = role, 
+            compiled = compiled,
             mode = mode,
             relative_root = Context().relative_root(),
             tags = self.tags,
+            trace = Tracer().enabled(),
             checksums = self.checksums,
             hostvars = host.all_variables(),
             extra_vars = Context().extra_vars()
         )
-        params = zlib.compress(dill.dumps(params), level=9)
+        with Tracer().span('payload', 'payload', host=host.name):
+            params = zlib.compress(dill.dumps(params), level=9)
         call_recv = conn.call_async(remote_fn, self.myself, params, sender)
         self.calls_sel.add(call_recv)
 
@@ -305,6 +312,8 @@ def remote_fn(caller, params, sender):
     # we should change this to have context objects that have more meat, but also get passed around versus acting globally, and smaller
     # function signatures across the board.
 
+    started = time.time()
+
     import dill
     from opsmop.core.executor import Executor
 
@@ -330,6 +339,16 @@ def remote_fn(caller, params, sender):
     policy.roles = Roles(role)
 
     Callbacks().set_callbacks([ EventStreamCallbacks(sender=sender), LocalCliCallbacks(), CommonCallbacks() ])
-    executor = Executor([ policy ], local_host=host, push=False, tags=params['tags'], extra_vars=extra_vars, relative_root=relative_root) # remove single_role
+    # the role arrives already compiled by the controller, see opsmop.core.compiler
+    programs = { role: params['compiled'] }
+    executor = Executor([ policy ], local_host=host, push=False, tags=params['tags'], extra_vars=extra_vars, relative_root=relative_root, programs=programs, prevalidated=True) # remove single_role
+    if params['trace']:
+        Tracer().enable()
+        Tracer().mark('bootstrap', 'bootstrap', started, host=host.name)
     # FIXME: care about mode
-    executor.apply()
+    try:
+        executor.apply()
+    finally:
+        if Tracer().enabled():
+            # the controller adds these to its own trace, see ReplayCallbacks.on_trace
+            Callbacks().on_trace(Tracer().take())
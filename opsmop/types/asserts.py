@@ -19,6 +19,8 @@ from opsmop.types.type import Type
 
 class Asserts(Type):
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         (original, common) = self.split_common_kwargs(kwargs)
         self.setup(evals=args, variable_checks=original, **common)
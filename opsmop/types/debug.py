@@ -20,6 +20,8 @@ from opsmop.types.type import Type
 
 class Debug(Type):
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         (original, common) = self.split_common_kwargs(kwargs)
         self.setup(variable_names=args, evals=original, **common)
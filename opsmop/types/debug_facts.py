@@ -18,6 +18,8 @@ from opsmop.types.type import Type
 
 class DebugFacts(Type):
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         self.setup(**kwargs)
 
@@ -20,6 +20,8 @@ from opsmop.types.type import Type
 
 class Directory(Type):
 
+    __slots__ = [ 'directory' ]
+
     def __init__(self, name=None, **kwargs):
         self.setup(name=name, **kwargs)
         self.directory = True
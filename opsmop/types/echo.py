@@ -19,6 +19,8 @@ from opsmop.types.type import Type
 
 class Echo(Type):
 
+    __slots__ = []
+
     def __init__(self, msg, *args, **kwargs):
         self.setup(msg=msg, **kwargs)
 
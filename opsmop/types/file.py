@@ -20,6 +20,8 @@ from opsmop.types.type import Type
 
 class File(Type):
 
+    __slots__ = []
+
     def __init__(self, name=None, **kwargs):
         self.setup(name=name, **kwargs)
 
@@ -44,6 +46,9 @@ class File(Type):
         v.path_exists(self.from_file)
         v.path_exists(self.from_template)
 
+    def validation_paths(self):
+        return [ p for p in (self.from_file, self.from_template) if type(p) == str ]
+
     def default_provider(self):
         from opsmop.providers.file import File
         return File
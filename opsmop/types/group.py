@@ -21,6 +21,8 @@ from opsmop.types.type import Type
 
 class Group(Type):
 
+    __slots__ = []
+
     def __init__(self, name=None, **kwargs):
         self.setup(name=name, **kwargs)
 
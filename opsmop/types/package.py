@@ -21,6 +21,8 @@ from opsmop.types.type import Type
 
 class Package(Type):
 
+    __slots__ = []
+
     def __init__(self, name=None, **kwargs):
         self.setup(name=name, **kwargs)
 
@@ -38,6 +40,13 @@ class Package(Type):
         # FIXME: latest and absent are incompatible, as are version and absent
         pass
 
+    def batch_key(self):
+        # packages next to each other are installed with one command where the package manager allows,
+        # see opsmop.providers.package.package.  The command runs with the limits of the first one, so
+        # only packages with the same limits go together (siblings share whatever limits they inherit)
+        limits = tuple(sorted(self.limits.items())) if self.limits else None
+        return (type(self), self.method, self.ignore_errors, limits)
+
     def get_provider(self, method):
         if method == 'brew':
             from opsmop.providers.package.brew import Brew
@@ -25,6 +25,8 @@ class Service(Type):
     Represents a OS background service.
     """
 
+    __slots__ = []
+
     def __init__(self, name=None, **kwargs):
         self.setup(name=name, **kwargs)
 
@@ -45,7 +47,7 @@ class Service(Type):
             from opsmop.providers.service.brew import Brew
             return Brew
         elif method == 'systemd':
-            from opsmop.providers.package.systemd import Systemd
+            from opsmop.providers.service.systemd import Systemd
             return Systemd
         raise NoSuchProviderError(self, method)
 
@@ -19,6 +19,8 @@ from opsmop.types.type import Type
 
 class Set(Type):
 
+    __slots__ = []
+
     def __init__(self, *args, **kwargs):
         (original, common) = self.split_common_kwargs(kwargs)
         self.setup(extra_variables=original, **common)
@@ -29,6 +31,9 @@ class Set(Type):
             variables = Field(kind=dict)
         )
 
+    def is_barrier(self):
+        return True
+
     def default_provider(self):
         from opsmop.providers.set import Set
         return Set
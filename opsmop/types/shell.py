@@ -23,6 +23,8 @@ class Shell(Type):
     Represents a command to be run
     """
 
+    __slots__ = []
+
     def __init__(self, cmd=None, **kwargs):
         self.setup(cmd=cmd, **kwargs)
 
@@ -19,6 +19,8 @@ from opsmop.types.type import Type
 
 class Stop(Type):
 
+    __slots__ = []
+
     def __init__(self, msg, *args, **kwargs):
         self.setup(msg=msg, **kwargs)
 
@@ -31,6 +33,9 @@ class Stop(Type):
     def validate(self):
         pass
 
+    def is_barrier(self):
+        return True
+
     def default_provider(self):
         from opsmop.providers.stop import Stop
         return Stop
@@ -12,9 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect
-import json
-
 from opsmop.core.resource import Resource
 from opsmop.core.template import Template
 from opsmop.lookups.lookup import Lookup
@@ -22,6 +19,8 @@ from opsmop.lookups.lookup import Lookup
 
 class Type(Resource):
 
+    __slots__ = [ '_context' ]
+
     def validate(self):
         pass
 
@@ -30,17 +29,21 @@ class Type(Resource):
         Given a facts instance, obtain the provider used to fulfill the resource. 
         """
 
-        cls = None
-        if 'method' in self.kwargs:
-            method = self.kwargs.get('method')
-            cls = self.get_provider(method)
-        else:
-            cls = self.default_provider()
+        cls = self.provider_class()
+        cls.link_fields(self._field_spec)
         inst = cls(self)
-        self.copy_fields_to_provider(inst)
         self.resolve_provider_fields(inst)
         return inst
 
+    def provider_class(self):
+        """
+        The class of the provider that provider() returns.
+        """
+        if 'method' in self.kwargs:
+            method = self.kwargs.get('method')
+            return self.get_provider(method)
+        return self.default_provider()
+
     # ---------------------------------------------------------------
 
     def get_provider(self, provider):
@@ -48,29 +51,15 @@ class Type(Resource):
 
     # ---------------------------------------------------------------
 
-    def copy_fields_to_provider(self, provider):
+    def resolve_provider_fields(self, provider):
         """
-        Transfer fields like self.name or self.owner or the provider object.
+        Providers read fields like self.name or self.owner from the resource (see providers.provider.ResourceField),
+        so only the values of lookups, evaluated for this run, are stored on the provider itself.
         """
 
-        if self._field_spec is None:
-            # this is for types like Set() that have unrestricted parameters
-            for (k,v) in self.kwargs.items():
-                setattr(provider, k, v)
-        else:
-            for (k, spec) in self._field_spec.fields.items():
-                value = getattr(self, k)
-                setattr(provider, k, value)
-
-    # ---------------------------------------------------------------
-
-    def resolve_provider_fields(self, provider):
-
-        for (k, spec) in self._field_spec.fields.items():
-            value = getattr(provider, k)
+        for ((k, spec), value) in zip(self._field_spec.fields.items(), self._values):
             if issubclass(type(value), Lookup) and not spec.lazy:
-                value = value.evaluate(provider.resource)
-            setattr(provider, k, value)
+                setattr(provider, k, value.evaluate(provider.resource))
 
     # ---------------------------------------------------------------
 
@@ -9,7 +9,7 @@ setup(name='opsmop',
       author_email='michael@michaeldehaan.net',
       license='Apache 2',
       url='https://opsmop.io/',
-      packages=find_packages(exclude=['docs']),
+      packages=find_packages(exclude=['docs', 'benchmarks', 'benchmarks.*']),
       install_requires=[
           "PyYAML>=3.13"
           "toml>=0.10"
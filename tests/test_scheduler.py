@@ -0,0 +1,87 @@
+# Copyright 2018 Michael DeHaan LLC, <michael@michaeldehaan.net>
+# 
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import time
+
+import pytest
+
+from opsmop.core.scheduler import Scheduler
+
+
+class FakeResource(object):
+
+    def __init__(self, name, requires=None, action=None):
+        self.name = name
+        self.requires = requires
+        self.action = action
+
+    def is_barrier(self):
+        return False
+
+class FakeStep(object):
+
+    def __init__(self, resource):
+        self.resource = resource
+
+class FakeProgram(object):
+
+    def __init__(self, resources):
+        self.steps = [ FakeStep(r) for r in resources ]
+        self.pruned = False
+
+def run(resources, workers):
+    """ submits every resource to a scheduler the way the Executor does, returning what ran """
+    ran = []
+    lock = threading.Lock()
+    def execute(resource):
+        with lock:
+            ran.append(resource.name)
+        if resource.action:
+            resource.action()
+    scheduler = Scheduler(FakeProgram(resources), workers)
+    try:
+        for resource in resources:
+            scheduler.submit(resource, execute)
+        # let everything settle, so the failure is found by wait() with all futures done
+        time.sleep(0.5)
+        scheduler.wait()
+    finally:
+        scheduler.shutdown()
+    return ran
+
+def fail():
+    raise ValueError("boom")
+
+def test_original_error_when_dependent_is_queued_before_failure():
+    started = []
+    slow = FakeResource('slow', action=lambda: time.sleep(0.2))
+    # declared (and submitted) before the failing resource, waits on 'slow' and is then cancelled
+    dependent = FakeResource('dependent', requires=[ slow ], action=lambda: started.append('dependent'))
+    failing = FakeResource('failing', action=fail)
+    with pytest.raises(ValueError, match="boom"):
+        run([ slow, dependent, failing ], workers=3)
+    assert started == []
+
+def test_queued_resources_do_not_start_after_failure():
+    started = []
+    def record(name):
+        def action():
+            started.append(name)
+            time.sleep(0.05)
+        return action
+    resources = [ FakeResource('failing', action=fail), FakeResource('running', action=lambda: time.sleep(0.3)) ]
+    resources.extend(FakeResource('queued%s' % i, action=record('queued%s' % i)) for i in range(6))
+    with pytest.raises(ValueError, match="boom"):
+        run(resources, workers=2)
+    assert started == []